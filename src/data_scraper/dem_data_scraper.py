@@ -1,41 +1,202 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urljoin
+from download_manifest import DownloadManifest, MANIFEST_FILENAME, sha256_file
 
 # --- Configuration ---
 URL = "https://gis.ess.washington.edu/data/raster/tenmeter/byquad/master.html"
 DOWNLOAD_DIR = "../Documents/soilense_data/DEM/washington_dem_tiles"
 TEST_DOWNLOAD_LIMIT = None # Set this to the number of files you want to download for testing
+MAX_WORKERS = 8            # Concurrent downloads (and pooled connections)
+CHUNK_SIZE = 1024 * 1024   # Bytes per streamed chunk
+MAX_RETRIES = 5            # Attempts per file before giving up
+BACKOFF_SECONDS = 1.0      # Retry delay doubles from this value after each failure
+TIMEOUT_SECONDS = 60       # Connect/read timeout per request
+MANIFEST_SAVE_EVERY = 50   # Completed downloads between manifest checkpoints
 # ---------------------
 
-def download_file(url, directory):
-    """Downloads a file from a URL to a specified directory."""
-    local_filename = url.split('/')[-1]
-    filepath = os.path.join(directory, local_filename)
+def create_session(max_workers=MAX_WORKERS):
+    """Creates one requests session whose connection pool is shared by all download threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _unsatisfied_range_length(headers):
+    """Complete length from the Content-Range of a 416 response ('bytes */<length>'), or None."""
+    content_range = headers.get('Content-Range', '')
+    unit, _, length = content_range.partition(' */')
+    if unit.strip() != 'bytes' or not length.strip().isdigit():
+        return None
+    return int(length)
+
+def _fetch_to_partial(session, url, partial_path, chunk_size, conditional_headers=None, manifest=None):
+    """
+    Streams url into partial_path, resuming from the bytes already there with an HTTP Range request.
+    Raises requests.exceptions.RequestException on failure; the partial file is kept for the next attempt.
+
+    Returns:
+        tuple: (False, None) if the server answered 304 Not Modified to the conditional headers,
+               otherwise (True, response headers).
+    """
+    resume_from = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    headers = dict(conditional_headers or {})
+    if resume_from:
+        headers['Range'] = f'bytes={resume_from}-'
+        partial_etag = (manifest.get(url) or {}).get('partial_etag') if manifest else None
+        if partial_etag:
+            # Only resume if the file upstream is still the one the partial came from
+            headers['If-Range'] = partial_etag
 
-    if os.path.exists(filepath):
-        print(f"File already exists: {local_filename}. Skipping download.")
-        return True # Indicate that the file was skipped (exists)
+    with session.get(url, stream=True, headers=headers, timeout=TIMEOUT_SECONDS) as r:
+        if r.status_code == 304:
+            return False, None
+        if r.status_code == 416:
+            # Range starts at/after the end. The partial file holds the whole body only if
+            # it is exactly as long as the upstream file (Content-Range: bytes */<length>)
+            if _unsatisfied_range_length(r.headers) == resume_from:
+                return True, r.headers
+            # Upstream shrank or was replaced: the partial is stale, start again from byte 0
+            os.remove(partial_path)
+            if manifest is not None:
+                manifest.update(url, partial_etag=None)
+            return _fetch_to_partial(session, url, partial_path, chunk_size, conditional_headers, manifest)
+        r.raise_for_status()
+        if manifest is not None and r.status_code == 200:
+            manifest.update(url, partial_etag=r.headers.get('ETag'))
+        # 206 means the server honoured the Range header; anything else restarts from scratch
+        mode = 'ab' if r.status_code == 206 else 'wb'
+        with open(partial_path, mode) as f:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+        return True, r.headers
 
-    print(f"Downloading: {local_filename} to {filepath}") # <-- Modified print
+def _adopt_existing_file(session, url, filepath, manifest):
+    """
+    Adds a file downloaded before the manifest existed, if a HEAD request shows the
+    same size upstream. Returns True if the file was adopted.
+    """
     try:
-        with requests.get(url, stream=True) as r:
-            r.raise_for_status()
-            with open(filepath, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-        print(f"Successfully downloaded: {local_filename}")
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"Error downloading {local_filename}: {e}")
+        r = session.head(url, allow_redirects=True, timeout=TIMEOUT_SECONDS)
+        r.raise_for_status()
+    except requests.exceptions.RequestException:
+        return False
+    if r.headers.get('Content-Length') != str(os.path.getsize(filepath)):
         return False
+    manifest.update(url, filename=os.path.basename(filepath), size=os.path.getsize(filepath),
+                    etag=r.headers.get('ETag'), last_modified=r.headers.get('Last-Modified'),
+                    sha256=sha256_file(filepath))
+    return True
+
+def _conditional_headers(entry):
+    """If-None-Match / If-Modified-Since headers from a manifest entry."""
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+def download_file(url, directory, session=None, manifest=None, verify_checksum=False,
+                  max_retries=MAX_RETRIES, backoff=BACKOFF_SECONDS, chunk_size=CHUNK_SIZE):
+    """
+    Downloads a file from a URL to a specified directory.
+
+    Data is written to <file>.part and moved into place only once complete, so an
+    interrupted run never leaves a truncated file under the final name. Failed
+    attempts are retried with exponential backoff and resume from the partial file.
 
-def scrape_and_download(url, download_dir, limit=None):
-    """Scrapes links from a webpage and downloads specified files, with an optional limit."""
+    With a DownloadManifest, an existing file is re-requested conditionally
+    (ETag / Last-Modified) and skipped on 304. Files whose size (or, with
+    verify_checksum, SHA-256) no longer matches the manifest are fetched again.
+    Without one, an existing file is assumed to be current.
+    """
+    local_filename = url.split('/')[-1]
+    filepath = os.path.join(directory, local_filename)
+    partial_path = filepath + '.part'
+    session = session or requests.Session()
+
+    conditional_headers = {}
+    if manifest is None:
+        if os.path.exists(filepath):
+            print(f"File already exists: {local_filename}. Skipping download.")
+            return True # Indicate that the file was skipped (exists)
+    else:
+        status = manifest.check_local_file(url, filepath, verify_checksum)
+        if status == 'ok':
+            conditional_headers = _conditional_headers(manifest.get(url))
+        elif status == 'corrupt':
+            print(f"Local file does not match the manifest: {local_filename}. Fetching again.")
+        elif status == 'unknown':
+            if _adopt_existing_file(session, url, filepath, manifest):
+                print(f"File already exists and matches upstream size: {local_filename}. Added to manifest.")
+                return True
+
+    print(f"Downloading: {local_filename} to {filepath}")
+    for attempt in range(max_retries):
+        try:
+            modified, headers = _fetch_to_partial(session, url, partial_path, chunk_size,
+                                                  conditional_headers, manifest)
+            if not modified:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                print(f"Not modified upstream: {local_filename}. Skipping download.")
+                return True
+            os.replace(partial_path, filepath)
+            if manifest is not None:
+                previous = manifest.get(url) or {}
+                manifest.update(url, filename=local_filename, size=os.path.getsize(filepath),
+                                etag=headers.get('ETag') or previous.get('partial_etag'),
+                                last_modified=headers.get('Last-Modified'),
+                                sha256=sha256_file(filepath), partial_etag=None)
+            print(f"Successfully downloaded: {local_filename}")
+            return True
+        except requests.exceptions.RequestException as e:
+            if attempt + 1 == max_retries:
+                print(f"Error downloading {local_filename} after {max_retries} attempts: {e}")
+                return False
+            delay = backoff * 2 ** attempt
+            print(f"Error downloading {local_filename} (attempt {attempt + 1}/{max_retries}): {e}. "
+                  f"Retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def download_files(urls, directory, max_workers=MAX_WORKERS, session=None, manifest=None, **download_kwargs):
+    """
+    Downloads many files concurrently over one pooled session.
+    The manifest, if given, is checkpointed every MANIFEST_SAVE_EVERY files and saved at the end.
+
+    Returns:
+        int: Number of files downloaded or already present.
+    """
+    session = session or create_session(max_workers)
+    succeeded = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(download_file, url, directory, session, manifest, **download_kwargs)
+                   for url in urls]
+        for completed, future in enumerate(as_completed(futures), start=1):
+            if future.result():
+                succeeded += 1
+            if manifest is not None and completed % MANIFEST_SAVE_EVERY == 0:
+                manifest.save()
+    if manifest is not None:
+        manifest.save()
+    return succeeded
+
+def scrape_and_download(url, download_dir, limit=None, max_workers=MAX_WORKERS, verify_checksums=False):
+    """
+    Scrapes links from a webpage and downloads specified files, with an optional limit.
+    A download manifest in the download directory makes reruns fetch only new or changed
+    files; verify_checksums also re-hashes local files to catch silent corruption.
+    """
+    session = create_session(max_workers)
     print(f"Accessing: {url}")
     try:
-        response = requests.get(url)
+        response = session.get(url, timeout=TIMEOUT_SECONDS)
         response.raise_for_status()
 
     except requests.exceptions.RequestException as e:
@@ -61,23 +222,23 @@ def scrape_and_download(url, download_dir, limit=None):
 
     links = soup.find_all('a')
     print(f"Found {len(links)} potential links.")
-    downloaded_count = 0
 
+    file_urls = []
     for link in links:
         href = link.get('href')
         if href and href.endswith('.zip'):
-            file_url = urljoin(url, href)
-
-            # Use the resolved path for downloading
-            if download_file(file_url, resolved_download_dir):
-                downloaded_count += 1
+            file_urls.append(urljoin(url, href))
+    if limit is not None:
+        file_urls = file_urls[:limit]
+        print(f"Limiting downloads to the first {limit} files.")
 
-            if limit is not None and downloaded_count >= limit:
-                print(f"Reached download limit of {limit}. Stopping.")
-                break
+    # Use the resolved path for downloading
+    manifest = DownloadManifest(os.path.join(resolved_download_dir, MANIFEST_FILENAME))
+    downloaded_count = download_files(file_urls, resolved_download_dir, max_workers, session,
+                                      manifest, verify_checksum=verify_checksums)
 
     print("-" * 20)
-    print(f"Finished checking links. Attempted to download {downloaded_count} .zip files (or skipped if already present).")
+    print(f"Finished checking links. Downloaded {downloaded_count} of {len(file_urls)} .zip files (or skipped if already present).")
 
 if __name__ == "__main__":
-    scrape_and_download(URL, DOWNLOAD_DIR, limit=TEST_DOWNLOAD_LIMIT)
\ No newline at end of file
+    scrape_and_download(URL, DOWNLOAD_DIR, limit=TEST_DOWNLOAD_LIMIT)
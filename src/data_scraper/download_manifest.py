@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import threading
+
+MANIFEST_FILENAME = "download_manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def sha256_file(filepath, chunk_size=HASH_CHUNK_SIZE):
+    """Returns the hex SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class DownloadManifest:
+    """
+    Persistent record of every downloaded file, keyed by URL:
+    filename, size, etag, last_modified and sha256.
+
+    The validators (ETag / Last-Modified) let reruns send conditional requests and
+    skip unchanged files on a 304 without reading them. Size and SHA-256 let a
+    rerun spot truncated or corrupted local copies and fetch them again.
+    The manifest is shared by the download threads and written atomically.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error loading download manifest {path}, starting a new one: {e}")
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            return dict(entry) if entry is not None else None
+
+    def update(self, url, **fields):
+        with self._lock:
+            self._entries.setdefault(url, {}).update(fields)
+
+    def check_local_file(self, url, filepath, verify_checksum=False):
+        """
+        Compares a local file against its manifest entry.
+
+        Returns:
+            str: 'missing' (no local file), 'unknown' (no manifest entry),
+                 'corrupt' (size or checksum mismatch) or 'ok'.
+        """
+        if not os.path.exists(filepath):
+            return 'missing'
+        entry = self.get(url)
+        if entry is None or 'sha256' not in entry:
+            return 'unknown'
+        if os.path.getsize(filepath) != entry.get('size'):
+            return 'corrupt'
+        if verify_checksum and sha256_file(filepath) != entry['sha256']:
+            return 'corrupt'
+        return 'ok'
+
+    def save(self):
+        """Writes the manifest to a temporary file and moves it into place."""
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
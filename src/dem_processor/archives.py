@@ -0,0 +1,50 @@
+import fnmatch
+import os
+import zipfile
+
+VSIZIP_PREFIX = "/vsizip/"
+
+def vsizip_path(zip_path, member):
+    """GDAL virtual path of a member inside a zip archive (readable by gdal.Open and rasterio.open)."""
+    return f"{VSIZIP_PREFIX}{os.path.abspath(zip_path)}/{member}"
+
+def archive_of(path):
+    """Returns the zip archive path for a /vsizip/ path, or None for a regular file."""
+    if not path.startswith(VSIZIP_PREFIX):
+        return None
+    inner = path[len(VSIZIP_PREFIX):]
+    lowered = inner.lower()
+    end = lowered.find('.zip/')
+    return inner[:end + len('.zip')] if end >= 0 else None
+
+def match_raster_members(member_names, raster_type_patterns):
+    """
+    Returns (member, feature_type) pairs for archive members matching the type patterns.
+    Patterns are matched against the member's base name, case-insensitively.
+    """
+    matches = []
+    for member in member_names:
+        if member.endswith('/'):
+            continue
+        name = os.path.basename(member).lower()
+        for feature_type, pattern in raster_type_patterns.items():
+            if fnmatch.fnmatch(name, pattern.lower()):
+                matches.append((member, feature_type))
+                break
+    return matches
+
+def list_archive_rasters(zip_path, raster_type_patterns):
+    """
+    Lists the raster members of a zip archive as /vsizip/ paths.
+
+    Returns:
+        list: (vsizip path, feature_type) pairs. Empty if the archive cannot be read.
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            members = archive.namelist()
+    except (zipfile.BadZipFile, OSError) as e:
+        print(f"Error: {os.path.basename(zip_path)} is not a readable zip file: {e}")
+        return []
+    return [(vsizip_path(zip_path, member), feature_type)
+            for member, feature_type in match_raster_members(members, raster_type_patterns)]
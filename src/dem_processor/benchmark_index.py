@@ -0,0 +1,59 @@
+import os
+import tempfile
+import time
+import numpy as np
+import rtree
+from indexer import build_spatial_index
+
+# --- Configuration ---
+TILE_COUNTS = [10_000, 100_000]
+QUERY_COUNT = 10_000
+TILE_SIZE = 1.0
+# ---------------------
+
+def make_tile_bounds(n_tiles, tile_size=TILE_SIZE, seed=0):
+    """Returns (id, (left, bottom, right, top)) entries for a jittered square grid of tiles."""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n_tiles)))
+    cells = rng.permutation(side * side)[:n_tiles]
+    left = (cells % side) * tile_size + rng.uniform(-0.05, 0.05, n_tiles) * tile_size
+    bottom = (cells // side) * tile_size + rng.uniform(-0.05, 0.05, n_tiles) * tile_size
+    return [(i, (left[i], bottom[i], left[i] + tile_size, bottom[i] + tile_size)) for i in range(n_tiles)]
+
+def build_by_insert(index_prefix, entries):
+    """The per-raster insert path the indexer used before bulk loading."""
+    properties = rtree.index.Property()
+    properties.overwrite = True
+    spatial_index = rtree.index.Index(index_prefix, properties=properties)
+    for raster_id, bbox in entries:
+        spatial_index.insert(raster_id, bbox)
+    return spatial_index
+
+def time_queries(spatial_index, extent, query_count=QUERY_COUNT, seed=1):
+    """Returns mean point-query latency in microseconds."""
+    rng = np.random.default_rng(seed)
+    xs = rng.uniform(0, extent, query_count)
+    ys = rng.uniform(0, extent, query_count)
+    start = time.perf_counter()
+    for x, y in zip(xs, ys):
+        list(spatial_index.intersection((x, y, x, y)))
+    return (time.perf_counter() - start) / query_count * 1e6
+
+def run_benchmark(tile_counts=TILE_COUNTS):
+    """Compares build time and query latency of the insert path and the STR bulk-load path."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_tiles in tile_counts:
+            entries = make_tile_bounds(n_tiles)
+            extent = np.ceil(np.sqrt(n_tiles)) * TILE_SIZE
+            for name, build in (('insert', build_by_insert), ('bulk (STR)', build_spatial_index)):
+                index_prefix = os.path.join(tmp_dir, f"{name.split()[0]}_{n_tiles}")
+                start = time.perf_counter()
+                spatial_index = build(index_prefix, entries)
+                build_seconds = time.perf_counter() - start
+                query_us = time_queries(spatial_index, extent)
+                spatial_index.close()
+                print(f"{n_tiles:>7} tiles | {name:<10} | build {build_seconds:8.2f} s | "
+                      f"point query {query_us:7.1f} us")
+
+if __name__ == "__main__":
+    run_benchmark()
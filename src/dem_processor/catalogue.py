@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import numpy as np
+from rasterio.coords import BoundingBox
+from rasterio.crs import CRS
+
+# Fixed-width record per raster. Strings that repeat across rasters (type, CRS)
+# are interned into small tables in the JSON sidecar and stored here as codes.
+_RECORD_FIELDS = [
+    ('id', np.int64),
+    ('left', np.float64),
+    ('bottom', np.float64),
+    ('right', np.float64),
+    ('top', np.float64),
+    ('type_code', np.int16),
+    ('crs_code', np.int16),   # -1 if the raster has no CRS
+    ('size', np.int64),
+    ('mtime', np.float64),
+]
+
+def _sidecar_path(catalogue_path):
+    return os.path.splitext(catalogue_path)[0] + '.json'
+
+class RasterCatalogue:
+    """
+    Columnar raster catalogue: one fixed-width record per raster, sorted by id.
+
+    The records are a NumPy structured array that is memory-mapped on load, so
+    opening a catalogue of tens of thousands of rasters only reads the small
+    JSON sidecar (type and CRS tables). CRS objects are decoded on demand and
+    cached per CRS code.
+
+    Iterating or indexing the catalogue yields the same dicts as the old raster
+    info list: id, path, type, size, mtime, bounds (BoundingBox) and crs.
+
+    next_id is a high-water mark kept in the sidecar: above every id the catalogue
+    has ever held, including rasters since removed, so ids are never reused.
+    """
+
+    def __init__(self, records, type_table, crs_table, next_id=None):
+        self.records = records
+        self.type_table = list(type_table)
+        self.crs_table = list(crs_table)
+        max_id = int(records['id'].max()) if len(records) else -1
+        self.next_id = max(max_id + 1, next_id or 0)
+        self._crs_cache = {}
+        self._versions = None
+
+    @classmethod
+    def from_info_list(cls, raster_info_list, next_id=None):
+        """Builds a catalogue from a list of raster info dicts, keeping next_id if it is higher."""
+        raster_info_list = sorted(raster_info_list, key=lambda info: info['id'])
+        type_codes, crs_codes = {}, {}
+        max_path = max((len(info['path']) for info in raster_info_list), default=1)
+        dtype = np.dtype(_RECORD_FIELDS + [('path', f'U{max_path}')])
+        records = np.zeros(len(raster_info_list), dtype=dtype)
+        for i, info in enumerate(raster_info_list):
+            bounds = info['bounds']
+            crs = info['crs']
+            crs_code = -1 if crs is None else crs_codes.setdefault(crs.to_string(), len(crs_codes))
+            records[i] = (
+                info['id'], bounds.left, bounds.bottom, bounds.right, bounds.top,
+                type_codes.setdefault(info['type'], len(type_codes)), crs_code,
+                info.get('size', -1), info.get('mtime', np.nan), info['path'],
+            )
+        return cls(records, list(type_codes), list(crs_codes), next_id)
+
+    @classmethod
+    def load(cls, catalogue_path, mmap=True):
+        """Loads a catalogue saved with save(), memory-mapping the records by default."""
+        with open(_sidecar_path(catalogue_path)) as f:
+            tables = json.load(f)
+        records = np.load(catalogue_path, mmap_mode='r' if mmap else None)
+        # Sidecars written before next_id existed fall back to the highest id + 1
+        return cls(records, tables['types'], tables['crs'], tables.get('next_id'))
+
+    def save(self, catalogue_path):
+        """
+        Saves the records (.npy) and the type/CRS tables and next_id (JSON sidecar).
+
+        Each file is written to a temporary path and moved into place, so a
+        catalogue memory-mapped by load() (possibly this one) keeps reading the
+        old file instead of one truncated under it.
+        """
+        tmp_path = catalogue_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(self.records))
+        os.replace(tmp_path, catalogue_path)
+
+        sidecar_path = _sidecar_path(catalogue_path)
+        tmp_path = sidecar_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'types': self.type_table, 'crs': self.crs_table, 'next_id': self.next_id}, f)
+        os.replace(tmp_path, sidecar_path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        for i in range(len(self.records)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        record = self.records[i]
+        return {
+            'id': int(record['id']),
+            'path': str(record['path']),
+            'type': self.type_table[record['type_code']],
+            'size': int(record['size']),
+            'mtime': float(record['mtime']),
+            'bounds': BoundingBox(float(record['left']), float(record['bottom']),
+                                  float(record['right']), float(record['top'])),
+            'crs': self.get_crs(int(record['crs_code'])),
+        }
+
+    @property
+    def ids(self):
+        return self.records['id']
+
+    def raster_versions(self, raster_ids=None):
+        """
+        64-bit version of each raster: a SHA-256 prefix over its id, path, type,
+        bounds, CRS, size and mtime. It changes when that raster is moved or
+        rewritten, and only then, so data derived from one tile can be checked
+        against that tile alone.
+
+        Args:
+            raster_ids (array-like, optional): Ids to look up. Defaults to every record, in order.
+
+        Returns:
+            np.ndarray: int64 versions, 0 for ids not in the catalogue.
+        """
+        if self._versions is None:
+            versions = np.zeros(len(self.records), dtype=np.int64)
+            for i, record in enumerate(self.records):
+                crs_code = int(record['crs_code'])
+                fields = [int(record['id']), str(record['path']), self.type_table[record['type_code']],
+                          [float(record[side]) for side in ('left', 'bottom', 'right', 'top')],
+                          self.crs_table[crs_code] if crs_code >= 0 else None,
+                          int(record['size']), float(record['mtime'])]
+                digest = hashlib.sha256(json.dumps(fields).encode()).digest()
+                versions[i] = int.from_bytes(digest[:8], 'little', signed=True)
+            self._versions = versions
+        if raster_ids is None:
+            return self._versions
+        raster_ids = np.asarray(raster_ids, dtype=np.int64)
+        result = np.zeros(len(raster_ids), dtype=np.int64)
+        if len(self.records):
+            positions = np.minimum(np.searchsorted(self.ids, raster_ids), len(self.records) - 1)
+            known = self.ids[positions] == raster_ids
+            result[known] = self._versions[positions[known]]
+        return result
+
+    def by_id(self, raster_id):
+        """Returns the info dict of the raster with the given id (records are sorted by id)."""
+        i = int(np.searchsorted(self.records['id'], raster_id))
+        if i >= len(self.records) or self.records['id'][i] != raster_id:
+            raise KeyError(raster_id)
+        return self[i]
+
+    def get_crs(self, crs_code):
+        """Decodes (and caches) the CRS for a CRS code, or returns None for -1."""
+        if crs_code < 0:
+            return None
+        if crs_code not in self._crs_cache:
+            self._crs_cache[crs_code] = CRS.from_string(self.crs_table[crs_code])
+        return self._crs_cache[crs_code]
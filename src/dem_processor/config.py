@@ -1,6 +1,6 @@
 # Filenames for saving the index files
 INDEX_FILE_PREFIX = "raster_spatial_index" # Creates raster_spatial_index.idx and .dat
-INFO_LIST_FILE = "raster_info_list.pkl"   # File to save raster metadata list
+CATALOGUE_FILE = "raster_catalogue.npy"   # Raster metadata catalogue (+ raster_catalogue.json sidecar)
 
 # List of directories containing your raster files (DEM, Slope, TWI, etc.)
 RASTER_DIRS = ["../../../soilense_data/DEM/washington_10meter_dem_tiles/reprojected_dems_wa_south_ft"]
@@ -8,4 +8,18 @@ RASTER_DIRS = ["../../../soilense_data/DEM/washington_10meter_dem_tiles/reprojec
 RASTER_TYPE_PATTERNS = {
     'TIF': '*.tif',
     'DEM': '*.dem',
-}
\ No newline at end of file
+}
+
+# Raster types holding elevations; point sampling ignores every other indexed type
+DEM_RASTER_TYPES = ['TIF', 'DEM']
+
+# Zip archives in RASTER_DIRS are indexed and read in place through GDAL /vsizip/ paths
+ARCHIVE_PATTERN = '*.zip'
+
+# Decimation factors for the overview pyramid (2x, 4x, 8x, ... the native resolution)
+OVERVIEW_FACTORS = [2, 4, 8, 16, 32, 64]
+
+# Reprojection stage (reproject_dems.py): state-plane CRS and grid of the RASTER_DIRS tiles
+TARGET_CRS = "ESRI:103181"      # NAD83(2011) StatePlane Washington South FIPS 4602, US survey feet
+TARGET_RESOLUTION_FT = 30.0     # Output pixel size; every tile is snapped to multiples of it
+SOURCE_ELEVATION_UNITS = 'm'    # Vertical units of the downloaded quads
@@ -1,6 +1,5 @@
 import logging
 import numpy as np
-from osgeo import gdal
 from typing import List
 import pandas as pd
 
@@ -70,6 +69,120 @@ def calculate_curvature(dem_array, cell_size):
     curvature = d2x_dx + d2y_dy
     return curvature
 
+# Layers computed by compute_terrain_derivatives
+TERRAIN_FEATURES = ['slope', 'aspect', 'curvature', 'hillshade']
+# Default memory budget (bytes) for the working set of one row block
+TERRAIN_MEMORY_BUDGET = 256 * 1024 ** 2
+# Approximate number of block-sized arrays alive at once while processing a row block
+_TERRAIN_TEMPORARIES = 8
+
+def _pad_block(dem_array, row_start, row_end):
+    """
+    Returns rows [row_start, row_end) of the DEM with a one-cell border on every side.
+    The border comes from the neighbouring rows where they exist, and is linearly
+    extrapolated (2 * edge - inner) at the edges of the DEM.
+    """
+    rows = dem_array.shape[0]
+    top = max(row_start - 1, 0)
+    bottom = min(row_end + 1, rows)
+    block = dem_array[top:bottom]
+    pad_rows = (1 if row_start == 0 else 0, 1 if row_end == rows else 0)
+    return np.pad(block, (pad_rows, (1, 1)), mode='reflect', reflect_type='odd')
+
+def compute_terrain_derivatives(dem_array, cell_size: float, features=None, out=None,
+                                dtype=None, memory_budget: int = TERRAIN_MEMORY_BUDGET,
+                                sun_azimuth: float = 315.0, sun_altitude: float = 45.0):
+    """
+    Calculates several terrain layers from a single pass over a DEM array.
+
+    First derivatives use the Horn 3x3 kernel and second derivatives the
+    Zevenbergen-Thorne 3x3 kernel. Both are computed once per row block and every
+    requested layer is derived from them. The DEM is processed in row blocks sized
+    to fit memory_budget, and results are written into preallocated output arrays.
+
+    Args:
+        dem_array (np.ndarray): 2D NumPy array of elevation values (NoData as NaN).
+        cell_size (float): The size of each cell/pixel in the DEM.
+        features (list, optional): Layers to compute, from TERRAIN_FEATURES.
+                                   Defaults to all of them.
+        out (dict, optional): Preallocated output arrays keyed by feature name,
+                              each with the shape of dem_array.
+        dtype (np.dtype, optional): Working and output dtype. Defaults to float32 for
+                                    float32 input and float64 otherwise.
+        memory_budget (int): Approximate bytes of working memory per row block.
+        sun_azimuth (float): Hillshade light source azimuth in degrees (clockwise from North).
+        sun_altitude (float): Hillshade light source altitude in degrees above the horizon.
+
+    Returns:
+        dict: Feature name -> 2D NumPy array.
+              slope: degrees; aspect: degrees (0-360, same convention as calculate_aspect);
+              curvature: Laplacian, as in calculate_curvature; hillshade: 0-255.
+    """
+    features = TERRAIN_FEATURES if features is None else list(features)
+    unknown = [f for f in features if f not in TERRAIN_FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown terrain features: {unknown}")
+
+    dem_array = np.asarray(dem_array)
+    if dtype is None:
+        dtype = np.float32 if dem_array.dtype == np.float32 else np.float64
+    dtype = np.dtype(dtype)
+    rows, cols = dem_array.shape
+
+    out = {} if out is None else out
+    for feature in features:
+        if feature not in out:
+            out[feature] = np.empty((rows, cols), dtype=dtype)
+        elif out[feature].shape != (rows, cols):
+            raise ValueError(f"Output buffer for '{feature}' has shape {out[feature].shape}, expected {(rows, cols)}")
+
+    bytes_per_row = (cols + 2) * dtype.itemsize * (_TERRAIN_TEMPORARIES + len(features))
+    block_rows = max(1, int(memory_budget // bytes_per_row))
+
+    sun_zenith = np.radians(90.0 - sun_altitude)
+    sun_azimuth_rad = np.radians(sun_azimuth)
+    sun_east = np.sin(sun_zenith) * np.sin(sun_azimuth_rad)
+    sun_north = np.sin(sun_zenith) * np.cos(sun_azimuth_rad)
+    sun_up = np.cos(sun_zenith)
+
+    for row_start in range(0, rows, block_rows):
+        row_end = min(row_start + block_rows, rows)
+        z = _pad_block(dem_array, row_start, row_end).astype(dtype, copy=False)
+
+        # 3x3 neighbourhood:  a b c / d e f / g h i
+        a, b, c = z[:-2, :-2], z[:-2, 1:-1], z[:-2, 2:]
+        d, e, f = z[1:-1, :-2], z[1:-1, 1:-1], z[1:-1, 2:]
+        g, h, i = z[2:, :-2], z[2:, 1:-1], z[2:, 2:]
+
+        # Horn first derivatives. dy follows the row index (south), like np.gradient.
+        dx = (c + 2 * f + i) - (a + 2 * d + g)
+        dx /= 8 * cell_size
+        dy = (g + 2 * h + i) - (a + 2 * b + c)
+        dy /= 8 * cell_size
+
+        block = slice(row_start, row_end)
+        if 'slope' in features:
+            slope = np.hypot(dx, dy)
+            np.arctan(slope, out=slope)
+            np.degrees(slope, out=out['slope'][block])
+        if 'aspect' in features:
+            aspect = np.degrees(np.arctan2(-dy, dx))
+            np.mod(450 - aspect, 360, out=out['aspect'][block])
+        if 'curvature' in features:
+            # Zevenbergen-Thorne: d2z/dx2 + d2z/dy2
+            curvature = (d + f) + (b + h)
+            curvature -= 4 * e
+            curvature /= cell_size ** 2
+            out['curvature'][block] = curvature
+        if 'hillshade' in features:
+            # Cosine of the angle between the surface normal and the sun vector
+            shade = sun_up - dx * sun_east + dy * sun_north
+            shade /= np.sqrt(1 + dx ** 2 + dy ** 2)
+            np.clip(shade, 0, 1, out=shade)
+            np.multiply(shade, 255, out=out['hillshade'][block])
+
+    return {feature: out[feature] for feature in features}
+
 def calculate_contours(dem_array, cell_x_coords, cell_y_coords, levels):
     """
     Generates contour lines from a DEM array.
@@ -100,84 +213,95 @@ def calculate_contours(dem_array, cell_x_coords, cell_y_coords, levels):
         })
     return contours_data
 
-def calculate_flow_direction_d8(dem_array):
+# D8 neighbour offsets and codes (ESRI convention), in tie-breaking order.
+# (row offset, col offset, code)
+D8_LOOKUP = [
+    (0, 1, 1),    # E
+    (-1, 1, 2),   # NE
+    (-1, 0, 4),   # N
+    (-1, -1, 8),  # NW
+    (0, -1, 16),  # W
+    (1, -1, 32),  # SW
+    (1, 0, 64),   # S
+    (1, 1, 128)   # SE
+]
+
+def calculate_flow_direction_d8(dem_array, distance_weighted: bool = True):
     """
     Calculates D8 flow direction from a DEM array.
 
+    The whole array is processed at once: the DEM is padded with a one-cell
+    NaN border and each of the 8 neighbours is compared through a shifted view,
+    keeping a running steepest drop and its direction code.
+
     Args:
-        dem_array (np.ndarray): 2D NumPy array of elevation values.
+        dem_array (np.ndarray): 2D NumPy array of elevation values. NoData cells
+                                should be NaN (see utils.handle_dem_nodata).
+        distance_weighted (bool): If True, diagonal drops are divided by sqrt(2)
+                                  so the steepest true slope wins. If False, the
+                                  raw elevation difference is used.
 
     Returns:
-        np.ndarray: 2D NumPy array of flow direction codes.
-                    (Codes might be: 1=E, 2=NE, 4=N, 8=NW, 16=W, 32=SW, 64=S, 128=SE,
-                     or other conventions like 1-8, or powers of 2).
-                     The example uses powers of 2.
+        np.ndarray: 2D NumPy array of flow direction codes (uint8).
+                    Codes (ESRI): 1=E, 2=NE, 4=N, 8=NW, 16=W, 32=SW, 64=S, 128=SE.
+                    0 marks flats, pits and NoData cells. Edge cells only
+                    consider the neighbours that lie inside the array.
     """
-    rows, cols = dem_array.shape
-    flow_dir = np.zeros_like(dem_array, dtype=np.uint8)
-    
-    # D8 direction codes (powers of 2, right to bottom-right clockwise)
-    # E, SE, S, SW, W, NW, N, NE
-    # Codes: 1  2  4  8   16  32  64 128 (GIS standard from ESRI)
-    # The source [7] used:
-    #   [[128, 64, 32],  (NW, N, NE in its comment mapping)
-    #    [  1,  0, 16],  (W, center, E)
-    #    [  2,  4,  8]]  (SW, S, SE)
-    # This seems to be a non-standard mapping or a typo in the comment.
-    # Let's use a common convention:
-    # 1=E, 2=NE, 4=N, 8=NW, 16=W, 32=SW, 64=S, 128=SE
-    # Offsets: (row, col), Code
-    # (0,1)=E=1, (-1,1)=NE=2, (-1,0)=N=4, (-1,-1)=NW=8, 
-    # (0,-1)=W=16, (1,-1)=SW=32, (1,0)=S=64, (1,1)=SE=128
-    
-    # Corrected D8 directions and codes (ESRI convention)
-    # dx, dy, code
-    d_lookup = [
-        (0, 1, 1),   # E
-        (-1, 1, 2),  # NE
-        (-1, 0, 4),  # N
-        (-1, -1, 8), # NW
-        (0, -1, 16), # W
-        (1, -1, 32), # SW
-        (1, 0, 64),  # S
-        (1, 1, 128)  # SE
-    ]
-
-    for r in range(1, rows - 1):
-        for c in range(1, cols - 1):
-            center_elev = dem_array[r, c]
-            max_drop = 0
-            best_dir = 0 # Default for flat areas/pits
-
-            for dr, dc, d_code in d_lookup:
-                nr, nc = r + dr, c + dc
-                neighbor_elev = dem_array[nr, nc]
-                drop = (center_elev - neighbor_elev) # Drop is positive if flowing down
-                
-                # For D8, typically uses drop / distance for true slope
-                # Simple D8 often just uses raw elevation difference
-                # distance = np.sqrt(dr**2 + dc**2) # 1 for cardinal, sqrt(2) for diagonal
-                # current_slope = drop / distance if distance > 0 else 0
-                
-                # Using simple drop as per source [7] logic structure
-                if drop > max_drop:
-                    max_drop = drop
-                    best_dir = d_code
-            
-            flow_dir[r, c] = best_dir
+    dem = np.asarray(dem_array)
+    if not np.issubdtype(dem.dtype, np.floating):
+        dem = dem.astype(np.float64)
+    rows, cols = dem.shape
+
+    padded = np.full((rows + 2, cols + 2), np.nan, dtype=dem.dtype)
+    padded[1:-1, 1:-1] = dem
+
+    flow_dir = np.zeros((rows, cols), dtype=np.uint8)
+    max_drop = np.zeros((rows, cols), dtype=dem.dtype)
+    drop = np.empty((rows, cols), dtype=dem.dtype)
+    steeper = np.empty((rows, cols), dtype=bool)
+    diagonal_weight = 1 / np.sqrt(2) if distance_weighted else 1.0
+
+    with np.errstate(invalid='ignore'):
+        for dr, dc, d_code in D8_LOOKUP:
+            neighbor = padded[1 + dr:rows + 1 + dr, 1 + dc:cols + 1 + dc]
+            # Drop is positive if flowing down
+            np.subtract(dem, neighbor, out=drop)
+            if dr != 0 and dc != 0:
+                drop *= diagonal_weight
+            # NaN drops (NoData centre/neighbour, or outside the array) compare False
+            np.greater(drop, max_drop, out=steeper)
+            np.copyto(max_drop, drop, where=steeper)
+            flow_dir[steeper] = d_code
+
     return flow_dir
 
-def get_dem_features_with_coordinates(dem_path):
+DEFAULT_FEATURES = ['elevation', 'slope', 'aspect']
+
+def extract_dem_feature_columns(dem_path, features=None):
     """
-    Extracts coordinates, elevation, and other derived features from a DEM file.
+    Extracts pixel-centre coordinates, elevation, and derived features from a DEM file
+    as a column store of NumPy arrays, one entry per non-NoData pixel.
+
+    Coordinates are computed from the geotransform with array arithmetic on the
+    row/column indices of the valid pixels, so no per-pixel Python objects are created.
 
     Args:
         dem_path (str): Path to the DEM file.
+        features (list, optional): Feature columns to include, from 'elevation' and
+                                   TERRAIN_FEATURES. Defaults to DEFAULT_FEATURES.
 
     Returns:
-        pandas.DataFrame or None: A DataFrame with columns for x, y, elevation,
-                                  and other derived features. Returns None if an error occurs.
+        dict or None: {'x': ..., 'y': ..., <feature>: ...} of equal-length 1D arrays.
+                      Returns None if an error occurs.
     """
+    features = DEFAULT_FEATURES if features is None else list(features)
+    unknown = [f for f in features if f != 'elevation' and f not in TERRAIN_FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown feature columns: {unknown}")
+
+    # GDAL is only needed to read files; the array functions above work without it
+    from osgeo import gdal
+
     try:
         dataset = gdal.Open(dem_path)
         if dataset is None:
@@ -195,63 +319,75 @@ def get_dem_features_with_coordinates(dem_path):
         band = dataset.GetRasterBand(1)
         elevation_array = band.ReadAsArray()
         nodata_value = band.GetNoDataValue()
-        cols = band.XSize
-        rows = band.YSize
-
-        # Calculate derived features
-        # Cell sizes for feature calculations (absolute values for height)
-        cell_size_x_geo = pixel_width # if geotransform[2] and geotransform[4] are 0
-        cell_size_y_geo = abs(pixel_height) # if geotransform[2] and geotransform[4] are 0
-        # Note: If DEM is in geographic coords (lat/lon), cell_size for slope etc.
-        # might need to be converted to meters or scaled.
-        # For simplicity here, assuming projected CRS or appropriate scaling is handled.
-
-        # Example of calculating features (replace with actual functions)
-        slope_array = calculate_slope_placeholder(elevation_array, cell_size_x_geo, cell_size_y_geo)
-        aspect_array = calculate_aspect_placeholder(elevation_array, cell_size_x_geo, cell_size_y_geo)
-        # curvature_array = calculate_curvature(elevation_array, cell_size_x_geo, cell_size_y_geo)
-        # hillshade_array = calculate_hillshade(elevation_array, cell_size_x_geo, cell_size_y_geo)
-
-
-        output_data = []
-        for r_idx in range(rows):
-            for c_idx in range(cols):
-                elevation = elevation_array[r_idx, c_idx]
-
-                # Skip NoData pixels
-                if nodata_value is not None and elevation == nodata_value:
-                    continue
-
-                # Calculate coordinate of the center of the pixel
-                x_coord = x_origin + (c_idx + 0.5) * pixel_width + (r_idx + 0.5) * x_rotation
-                y_coord = y_origin + (c_idx + 0.5) * y_rotation + (r_idx + 0.5) * pixel_height
-                
-                # Get corresponding feature values
-                slope = slope_array[r_idx, c_idx]
-                aspect = aspect_array[r_idx, c_idx]
-                # curvature = curvature_array[r_idx, c_idx]
-                # hillshade = hillshade_array[r_idx, c_idx]
-
-                output_data.append({
-                    'x': x_coord,
-                    'y': y_coord,
-                    'elevation': elevation,
-                    'slope': slope,
-                    'aspect': aspect,
-                    # 'curvature': curvature,
-                    # 'hillshade': hillshade
-                })
-        
         dataset = None # Close the dataset
-        
-        if not output_data:
+
+        # Cell size for feature calculations (assumes square pixels and a projected CRS)
+        cell_size = pixel_width
+
+        valid_mask = np.ones(elevation_array.shape, dtype=bool)
+        if nodata_value is not None:
+            valid_mask &= elevation_array != nodata_value
+        if np.issubdtype(elevation_array.dtype, np.floating):
+            valid_mask &= ~np.isnan(elevation_array)
+        r_idx, c_idx = np.nonzero(valid_mask)
+
+        # Coordinate of the center of each valid pixel
+        r_centre = r_idx + 0.5
+        c_centre = c_idx + 0.5
+        columns = {
+            'x': x_origin + c_centre * pixel_width + r_centre * x_rotation,
+            'y': y_origin + c_centre * y_rotation + r_centre * pixel_height,
+        }
+        del r_centre, c_centre
+
+        derived = [f for f in features if f != 'elevation']
+        if derived:
+            # NoData must not leak into the derivatives, so compute them on a NaN-masked copy
+            dem_array = elevation_array.astype(np.result_type(elevation_array.dtype, np.float32))
+            dem_array[~valid_mask] = np.nan
+            terrain = compute_terrain_derivatives(dem_array, cell_size, derived)
+            del dem_array
+        for feature in features:
+            if feature == 'elevation':
+                columns[feature] = elevation_array[r_idx, c_idx]
+            else:
+                columns[feature] = terrain.pop(feature)[r_idx, c_idx]
+
+        if len(r_idx) == 0:
             print("Warning: No data points extracted. DEM might be empty or all NoData.")
-            return pd.DataFrame() # Return empty DataFrame
 
-        return pd.DataFrame(output_data)
+        return columns
 
     except Exception as e:
         print(f"An error occurred: {e}")
         if 'dataset' in locals() and dataset is not None:
             dataset = None # Ensure dataset is closed on error
         return None
+
+def get_dem_features_with_coordinates(dem_path, features=None, output_path=None):
+    """
+    Extracts coordinates, elevation, and other derived features from a DEM file.
+
+    Args:
+        dem_path (str): Path to the DEM file.
+        features (list, optional): Feature columns to include. Defaults to DEFAULT_FEATURES.
+        output_path (str, optional): If given, the table is also written to this path,
+                                     as Parquet (.parquet) or Feather (.feather).
+
+    Returns:
+        pandas.DataFrame or None: A DataFrame with columns for x, y, elevation,
+                                  and other derived features. Returns None if an error occurs.
+    """
+    columns = extract_dem_feature_columns(dem_path, features)
+    if columns is None:
+        return None
+
+    df = pd.DataFrame(columns, copy=False)
+    if output_path is not None:
+        if output_path.endswith('.parquet'):
+            df.to_parquet(output_path, index=False)
+        elif output_path.endswith('.feather'):
+            df.to_feather(output_path)
+        else:
+            raise ValueError(f"Unsupported output format (expected .parquet or .feather): {output_path}")
+    return df
@@ -2,90 +2,245 @@ import rtree
 import rasterio
 import os
 import glob
-import pickle
-from config import INDEX_FILE_PREFIX, INFO_LIST_FILE, RASTER_DIRS, RASTER_TYPE_PATTERNS
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from archives import archive_of, list_archive_rasters
+from catalogue import RasterCatalogue
+from config import INDEX_FILE_PREFIX, CATALOGUE_FILE, RASTER_DIRS, RASTER_TYPE_PATTERNS, ARCHIVE_PATTERN
 
-# Helper function to save just the info list (separated from index saving)
-def save_raster_info(raster_info_list, info_list_path):
-    """Saves the raster info list to a pickle file."""
-    print(f"Saving raster info list to {info_list_path}")
+# R-tree node layout used for bulk-loaded builds
+INDEX_LEAF_CAPACITY = 100
+INDEX_CAPACITY = 100
+INDEX_FILL_FACTOR = 0.9
+
+# Helper function to save just the raster catalogue (separated from index saving)
+def save_raster_catalogue(raster_catalogue, catalogue_path):
+    """Saves the raster catalogue to a .npy file and its JSON sidecar."""
+    print(f"Saving raster catalogue to {catalogue_path}")
+    try:
+        raster_catalogue.save(catalogue_path)
+        print("Raster catalogue saved successfully.")
+    except Exception as e:
+        print(f"Error saving raster catalogue: {e}")
+
+def _read_raster_header(filepath):
+    """
+    Reads the bounds and CRS of one raster. Runs in a worker process.
+
+    Returns:
+        tuple: (filepath, bounds, crs, error message or None)
+    """
+    try:
+        with rasterio.open(filepath) as src:
+            return filepath, src.bounds, src.crs, None
+    except rasterio.errors.RasterioIOError as e:
+        return filepath, None, None, f"Error opening or reading raster file {filepath}: {e}"
+    except Exception as e:
+        return filepath, None, None, f"An unexpected error occurred processing {filepath}: {e}"
+
+def _find_raster_files(raster_dirs, raster_type_patterns, include_archives=True):
+    """
+    Returns (filepath, feature_type) pairs for every raster matching the patterns.
+    With include_archives, raster members of zip archives in the same directories are
+    returned as /vsizip/ paths, so they can be indexed and read without extraction.
+    """
+    found = []
+    for directory in raster_dirs:
+        archive_rasters = []
+        if include_archives:
+            for zip_path in sorted(glob.glob(os.path.join(directory, ARCHIVE_PATTERN))):
+                archive_rasters.extend(list_archive_rasters(zip_path, raster_type_patterns))
+        found.extend(archive_rasters)
+        archive_types = {feature_type for _, feature_type in archive_rasters}
+
+        for feature_type, pattern in raster_type_patterns.items():
+            search_pattern = os.path.join(directory, pattern)
+            raster_files = glob.glob(search_pattern)
+
+            if not raster_files and feature_type not in archive_types:
+                print(f"Warning: No files found for type '{feature_type}' with pattern '{search_pattern}'")
+                continue
+
+            found.extend((filepath, feature_type) for filepath in raster_files)
+    return found
+
+def _load_previous_catalogue(index_prefix, catalogue_path):
+    """Returns the previous raster catalogue if both it and the index files exist, else None."""
+    index_files_exist = os.path.exists(index_prefix + '.idx') and os.path.exists(index_prefix + '.dat')
+    if not index_files_exist or not os.path.exists(catalogue_path):
+        return None
     try:
-        with open(info_list_path, 'wb') as f:
-            pickle.dump(raster_info_list, f)
-        print("Info list saved successfully.")
+        return RasterCatalogue.load(catalogue_path)
     except Exception as e:
-        print(f"Error saving info list: {e}")
+        print(f"Error loading previous raster catalogue from {catalogue_path}, rebuilding from scratch: {e}")
+        return None
+
+def _bbox(bounds):
+    return (bounds.left, bounds.bottom, bounds.right, bounds.top)
+
+def build_spatial_index(index_prefix, entries, leaf_capacity=INDEX_LEAF_CAPACITY,
+                        index_capacity=INDEX_CAPACITY, fill_factor=INDEX_FILL_FACTOR):
+    """
+    Builds a persistent R-tree from a stream of entries in one bulk load.
+
+    rtree hands a generator stream to libspatialindex, which packs the tree with
+    Sort-Tile-Recursive (STR) bulk loading instead of inserting entries one by one.
+
+    Args:
+        index_prefix (str): Prefix path for the R-tree index files. Existing files are overwritten.
+        entries (iterable): (id, (left, bottom, right, top)) pairs.
+        leaf_capacity (int): Maximum entries per leaf node.
+        index_capacity (int): Maximum children per internal node.
+        fill_factor (float): Target node fill (0-1) used when packing.
+
+    Returns:
+        rtree.index.Index: The new index, open for reading and writing.
+    """
+    properties = rtree.index.Property()
+    properties.overwrite = True
+    properties.leaf_capacity = leaf_capacity
+    properties.index_capacity = index_capacity
+    properties.fill_factor = fill_factor
+
+    # A stream bulk load over existing files can leave the old root page in the
+    # header, so remove the previous index files instead of relying on overwrite
+    for extension in ('.idx', '.dat'):
+        if os.path.exists(index_prefix + extension):
+            os.remove(index_prefix + extension)
+
+    entries = iter(entries)
+    first = next(entries, None)
+    if first is None:
+        # libspatialindex rejects an empty bulk-load stream
+        return rtree.index.Index(index_prefix, properties=properties)
+    stream = ((raster_id, bbox, None) for raster_id, bbox in itertools.chain([first], entries))
+    return rtree.index.Index(index_prefix, stream, properties=properties)
 
 # Modified function to build the persistent index and save info list
-def build_and_save_raster_index(raster_dirs, raster_type_patterns, index_prefix, info_list_path):
+def build_and_save_raster_index(raster_dirs, raster_type_patterns, index_prefix, catalogue_path,
+                                incremental=True, max_workers=None, bulk_reload_fraction=0.1,
+                                include_archives=True, **index_properties):
     """
     Finds raster files, extracts their info, builds a *persistent* R-tree index
-    at the specified prefix, and saves the raster info list.
+    at the specified prefix, and saves the raster catalogue.
+
+    The catalogue doubles as a manifest (path, type, size, mtime, bounds, crs).
+    With incremental=True and an existing index, only new or changed files have
+    their headers read and deleted files are removed. Headers are read in parallel
+    across a process pool. Fresh builds, and updates touching more than
+    bulk_reload_fraction of the rasters, bulk load the R-tree with STR packing;
+    smaller updates are applied to the existing R-tree in place.
 
     Args:
         raster_dirs (list): Directories to search.
         raster_type_patterns (dict): Patterns for file types.
         index_prefix (str): Prefix path for the R-tree index files (e.g., "path/to/my_index").
                             R-tree will create/use files like my_index.idx and my_index.dat.
-        info_list_path (str): Path to save the raster info list pickle file.
+        catalogue_path (str): Path to save the raster catalogue (.npy, plus a .json sidecar).
+        incremental (bool): Reuse the previous index and catalogue when they exist.
+        max_workers (int, optional): Number of header-reading processes. Defaults to the CPU count.
+        bulk_reload_fraction (float): Changed fraction above which the index is bulk reloaded.
+        include_archives (bool): Also index raster members of zip archives (as /vsizip/ paths).
+        **index_properties: leaf_capacity, index_capacity, fill_factor for build_spatial_index.
 
     Returns:
-        tuple: (spatial_index, raster_info_list) if successful, (None, None) otherwise.
+        tuple: (spatial_index, raster_catalogue) if successful, (None, None) otherwise.
                The returned spatial_index is the *newly created and saved* persistent index,
                opened for reading.
     """
-    raster_info_list = []
-    raster_id_counter = 0
+    previous_catalogue = _load_previous_catalogue(index_prefix, catalogue_path) if incremental else None
+    previous_info_list = list(previous_catalogue) if previous_catalogue is not None else None
 
-    print(f"Building persistent R-tree index at {index_prefix}.*")
-    try:
-        # Create a persistent index. This tells rtree to manage index files
-        # at the given prefix. overwrite=True ensures we start fresh.
-        properties = rtree.index.Property()
-        properties.overwrite = True # Required to build a new index, overwriting existing files
-        # For rtree versions < 0.9.x, you might need: spatial_index = rtree.index.Index(index_prefix, properties=properties)
-        # For rtree versions >= 0.9.x, this is the standard way:
-        spatial_index = rtree.index.Index(index_prefix, properties=properties)
+    # Stat every file and split into reused / to-scan / removed against the manifest
+    raster_files = _find_raster_files(raster_dirs, raster_type_patterns, include_archives)
+    previous_by_path = {info['path']: info for info in previous_info_list or []}
+    reused, to_scan = [], []
+    for filepath, feature_type in raster_files:
+        try:
+            # Members of an archive share its size/mtime: a changed archive rescans all its members
+            stat = os.stat(archive_of(filepath) or filepath)
+        except OSError as e:
+            print(f"Error reading file metadata for {filepath}: {e}")
+            continue
+        previous = previous_by_path.pop(filepath, None)
+        if (previous is not None and previous['type'] == feature_type
+                and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime):
+            reused.append(previous)
+        else:
+            to_scan.append((filepath, feature_type, stat.st_size, stat.st_mtime, previous))
+    removed = list(previous_by_path.values())
 
+    print(f"Reading {len(to_scan)} raster headers with a process pool...")
+    scanned = []
+    if to_scan:
+        workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, len(to_scan) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            headers = executor.map(_read_raster_header, [item[0] for item in to_scan], chunksize=chunksize)
+            for (filepath, feature_type, size, mtime, previous), (_, bounds, crs, error) in zip(to_scan, headers):
+                if error is not None:
+                    print(error)
+                    if previous is not None:
+                        removed.append(previous)
+                    continue
+                scanned.append((filepath, feature_type, size, mtime, bounds, crs, previous))
+
+    # Changed files keep their id; new files get ids above every id ever used,
+    # from the high-water mark the catalogue keeps across removals
+    next_id = previous_catalogue.next_id if previous_catalogue is not None else 0
+    raster_info_list = list(reused)
+    changed = [] # (previous info or None, new info)
+    for filepath, feature_type, size, mtime, bounds, crs, previous in scanned:
+        if previous is not None:
+            raster_id = previous['id']
+        else:
+            raster_id = next_id
+            next_id += 1
+        raster_info = {
+            'id': raster_id,
+            'path': filepath,
+            'type': feature_type,
+            'size': size,
+            'mtime': mtime,
+            'bounds': bounds, # rasterio Bounds object is fine
+            'crs': crs       # rasterio CRS object is fine
+        }
+        raster_info_list.append(raster_info)
+        changed.append((previous, raster_info))
+    added_count = sum(previous is None for previous, _ in changed)
+
+    # Small changes are applied to the existing index; large ones are cheaper as a fresh bulk load
+    change_count = len(changed) + len(removed)
+    bulk_load = (previous_info_list is None
+                 or change_count > bulk_reload_fraction * max(len(raster_info_list), 1))
+    try:
+        if bulk_load:
+            print(f"Bulk loading persistent R-tree index at {index_prefix}.*")
+            spatial_index = build_spatial_index(
+                index_prefix,
+                ((info['id'], _bbox(info['bounds'])) for info in raster_info_list),
+                **index_properties
+            )
+        else:
+            print(f"Updating persistent R-tree index at {index_prefix}.* in place")
+            spatial_index = rtree.index.Index(index_prefix)
+            for raster_info in removed:
+                spatial_index.delete(raster_info['id'], _bbox(raster_info['bounds']))
+            for previous, raster_info in changed:
+                if previous is not None:
+                    spatial_index.delete(previous['id'], _bbox(previous['bounds']))
+                # Insert into the persistent index. rtree writes changes to disk.
+                spatial_index.insert(raster_info['id'], _bbox(raster_info['bounds']))
 
     except Exception as e:
         print(f"Error creating persistent R-tree index at {index_prefix}: {e}")
         return None, None
 
-    print("Indexing raster files and populating R-tree...")
-    for directory in raster_dirs:
-        for feature_type, pattern in raster_type_patterns.items():
-            search_pattern = os.path.join(directory, pattern)
-            raster_files = glob.glob(search_pattern)
-
-            if not raster_files:
-                print(f"Warning: No files found for type '{feature_type}' with pattern '{search_pattern}'")
-                continue
-
-            for filepath in raster_files:
-                try:
-                    with rasterio.open(filepath) as src:
-                        bounds = src.bounds
-                        crs = src.crs
-                        raster_info = {
-                            'id': raster_id_counter,
-                            'path': filepath,
-                            'type': feature_type,
-                            'bounds': bounds, # rasterio Bounds object is fine
-                            'crs': crs       # rasterio CRS object is fine
-                        }
-                        # Insert into the persistent index. rtree writes changes to disk.
-                        spatial_index.insert(raster_id_counter, (bounds.left, bounds.bottom, bounds.right, bounds.top))
-                        raster_info_list.append(raster_info)
-                        raster_id_counter += 1
-                        # print(f" Indexed: {os.path.basename(filepath)} ({feature_type})")
-
-                except rasterio.errors.RasterioIOError as e:
-                    print(f"Error opening or reading raster file {filepath}: {e}")
-                except Exception as e:
-                    print(f"An unexpected error occurred processing {filepath}: {e}")
+    raster_catalogue = RasterCatalogue.from_info_list(raster_info_list, next_id)
 
     print(f"Finished indexing. Total rasters indexed: {len(raster_info_list)}")
+    print(f"Reused: {len(reused)}, added: {added_count}, "
+          f"updated: {len(changed) - added_count}, removed: {len(removed)}")
 
     # Close the index to ensure all pending writes are flushed to disk
     try:
@@ -98,8 +253,8 @@ def build_and_save_raster_index(raster_dirs, raster_type_patterns, index_prefix,
          return None, None # Indicate failure if closing/saving fails
 
 
-    # Save the info list separately using the helper function
-    save_raster_info(raster_info_list, info_list_path)
+    # Save the catalogue separately using the helper function
+    save_raster_catalogue(raster_catalogue, catalogue_path)
 
     # Re-open the index in read mode for the function's return value
     # This ensures the index object returned is connected to the saved files
@@ -107,18 +262,18 @@ def build_and_save_raster_index(raster_dirs, raster_type_patterns, index_prefix,
         # Open the existing persistent index (no overwrite=True)
         loaded_index = rtree.index.Index(index_prefix)
         print("Persistent index re-opened for use after saving.")
-        return loaded_index, raster_info_list
+        return loaded_index, raster_catalogue
     except Exception as e:
          print(f"Error re-opening persistent index after saving: {e}")
          return None, None # Failed to load it back
 
 
-# Function to load persistent index and info list
-def load_raster_index(index_prefix, info_list_path):
-    """Loads the persistent spatial index and raster info list from files."""
-    print(f"Attempting to load persistent index from {index_prefix}.* and info list from {info_list_path}")
+# Function to load persistent index and raster catalogue
+def load_raster_index(index_prefix, catalogue_path):
+    """Loads the persistent spatial index and the memory-mapped raster catalogue from files."""
+    print(f"Attempting to load persistent index from {index_prefix}.* and catalogue from {catalogue_path}")
     loaded_index = None
-    loaded_info_list = None
+    loaded_catalogue = None
 
     try:
         # Load the rtree index from the persistent files
@@ -128,7 +283,7 @@ def load_raster_index(index_prefix, info_list_path):
     except rtree.index.IndexError:
         # This specifically catches if the .idx or .dat files are missing
         print(f"R-tree index files not found at {index_prefix}.*")
-        pass # Keep loaded_index as None and try loading info list
+        pass # Keep loaded_index as None and try loading the catalogue
 
     except Exception as e:
         # Catch other potential errors during index loading
@@ -137,26 +292,25 @@ def load_raster_index(index_prefix, info_list_path):
 
 
     try:
-        # Load the raster info list
-        with open(info_list_path, 'rb') as f:
-            loaded_info_list = pickle.load(f)
-        print("Info list loaded successfully.")
+        # Load the raster catalogue (records are memory-mapped, CRS decoded on demand)
+        loaded_catalogue = RasterCatalogue.load(catalogue_path)
+        print("Raster catalogue loaded successfully.")
     except FileNotFoundError:
-        print(f"Info list file not found at {info_list_path}")
-        loaded_info_list = None # Ensure it's None if file not found
+        print(f"Raster catalogue not found at {catalogue_path}")
+        loaded_catalogue = None # Ensure it's None if file not found
     except Exception as e:
-        # Catch other potential errors during info list loading (e.g., pickle issues)
-        print(f"Error loading info list from {info_list_path}: {e}")
-        loaded_info_list = None
+        # Catch other potential errors during catalogue loading (e.g., corrupt files)
+        print(f"Error loading raster catalogue from {catalogue_path}: {e}")
+        loaded_catalogue = None
 
 
     # Check if *both* parts were loaded successfully. Both are needed.
-    if loaded_index is not None and loaded_info_list is not None:
-         return loaded_index, loaded_info_list
+    if loaded_index is not None and loaded_catalogue is not None:
+         return loaded_index, loaded_catalogue
     else:
          # If either component failed to load, return None, None
-         print("Loading failed: R-tree index or info list is missing/corrupted.")
-         # Good practice: if the index was partially loaded but info list failed, close the index
+         print("Loading failed: R-tree index or raster catalogue is missing/corrupted.")
+         # Good practice: if the index was partially loaded but the catalogue failed, close the index
          if loaded_index:
              try:
                  loaded_index.close()
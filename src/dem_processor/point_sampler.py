@@ -0,0 +1,323 @@
+import numpy as np
+import rasterio
+from rasterio.merge import merge
+from rasterio.windows import Window, bounds as window_bounds
+from rasterio.transform import rowcol
+from feature_exractor import compute_terrain_derivatives
+from raster_cache import RASTER_CACHE
+from config import DEM_RASTER_TYPES
+
+# Points are grouped into clusters of CLUSTER_SIZE x CLUSTER_SIZE pixels within a tile.
+# Each cluster is served by a single windowed read, so widely spread points never
+# force a read of the whole tile.
+CLUSTER_SIZE = 512
+
+def find_raster_candidates(spatial_index, x, y, raster_catalogue=None, raster_types=DEM_RASTER_TYPES):
+    """
+    Finds every raster covering each point with one bulk query of the R-tree index.
+
+    Args:
+        spatial_index (rtree.index.Index): Index from indexer.load_raster_index.
+        x (np.ndarray): 1D array of x coordinates (in the CRS of the indexed rasters).
+        y (np.ndarray): 1D array of y coordinates.
+        raster_catalogue (RasterCatalogue, optional): If given, only rasters of raster_types are kept.
+        raster_types (list): Catalogue raster types to keep. Defaults to the DEM types.
+
+    Returns:
+        tuple: (ids, counts). ids holds the covering raster ids of all points,
+               concatenated in point order and ascending within each point;
+               counts holds the number of covering rasters per point.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    points = np.column_stack([x, y])
+    ids, counts = spatial_index.intersection_v(points, points)
+    ids = np.asarray(ids, dtype=np.int64)
+    owners = np.repeat(np.arange(len(x)), np.asarray(counts, dtype=np.int64))
+
+    if raster_catalogue is not None:
+        catalogue_ids = raster_catalogue.ids
+        positions = np.minimum(np.searchsorted(catalogue_ids, ids), max(len(catalogue_ids) - 1, 0))
+        wanted = [code for code, raster_type in enumerate(raster_catalogue.type_table)
+                  if raster_type in raster_types]
+        keep = np.zeros(len(ids), dtype=bool)
+        if len(catalogue_ids):
+            keep = ((catalogue_ids[positions] == ids)
+                    & np.isin(raster_catalogue.records['type_code'][positions], wanted))
+        ids, owners = ids[keep], owners[keep]
+
+    order = np.lexsort([ids, owners])
+    return ids[order], np.bincount(owners, minlength=len(x))
+
+def find_raster_ids(spatial_index, x, y, raster_catalogue=None, raster_types=DEM_RASTER_TYPES):
+    """
+    Finds the raster covering each point using the persistent R-tree index.
+
+    Args:
+        spatial_index (rtree.index.Index): Index from indexer.load_raster_index.
+        x (np.ndarray): 1D array of x coordinates (in the CRS of the indexed rasters).
+        y (np.ndarray): 1D array of y coordinates.
+        raster_catalogue (RasterCatalogue, optional): If given, only rasters of raster_types are considered.
+        raster_types (list): Catalogue raster types to consider. Defaults to the DEM types.
+
+    Returns:
+        np.ndarray: 1D int64 array of raster ids, -1 where no raster covers the point.
+                    If several rasters overlap a point, the lowest id is used.
+    """
+    ids, counts = find_raster_candidates(spatial_index, x, y, raster_catalogue, raster_types)
+    first = np.cumsum(counts) - counts
+    raster_ids = np.full(len(counts), -1, dtype=np.int64)
+    raster_ids[counts > 0] = ids[first[counts > 0]]
+    return raster_ids
+
+def _sample_cluster(src, elevation_window, rows, cols, row_off, col_off):
+    """Computes elevation, slope and aspect at the given pixels of a window read."""
+    cell_size = src.res[0]
+    local_rows = rows - row_off
+    local_cols = cols - col_off
+    elevation = elevation_window[local_rows, local_cols]
+    terrain = compute_terrain_derivatives(elevation_window, cell_size, ['slope', 'aspect'])
+    slope = terrain['slope'][local_rows, local_cols]
+    aspect = terrain['aspect'][local_rows, local_cols]
+    return elevation, slope, aspect
+
+def _read_window_with_neighbours(src, sources, row_off, col_off, row_end, col_end):
+    """
+    Reads a window that reaches up to one pixel past the raster edge, filling the
+    outside part from neighbouring rasters as tiled_processor.read_tile_with_halo
+    does for whole tiles. Outside rows/columns that no neighbour covers are dropped,
+    so the derivative kernel extrapolates there instead of propagating NaN.
+
+    Args:
+        src (rasterio.DatasetReader): Open raster whose pixel grid the window is in.
+        sources (list): src itself first, then its neighbours, all as paths or all as open datasets.
+        row_off, col_off, row_end, col_end (int): Window in the pixel grid of src.
+
+    Returns:
+        tuple: (float64 array with NoData as NaN, row offset, column offset), the
+               offsets locating its first pixel in the pixel grid of src.
+    """
+    window = Window(col_off, row_off, col_end - col_off, row_end - row_off)
+    # src goes first so it wins wherever rasters overlap
+    mosaic, _ = merge(sources, bounds=window_bounds(window, src.transform),
+                      res=src.res, nodata=np.nan, dtype='float64', indexes=[1])
+    elevation_window = mosaic[0]
+    top = int(row_off < 0 and np.isnan(elevation_window[0]).all())
+    bottom = int(row_end > src.height and np.isnan(elevation_window[-1]).all())
+    left = int(col_off < 0 and np.isnan(elevation_window[:, 0]).all())
+    right = int(col_end > src.width and np.isnan(elevation_window[:, -1]).all())
+    rows, cols = elevation_window.shape
+    return elevation_window[top:rows - bottom, left:cols - right], row_off + top, col_off + left
+
+def sample_raster_points(src, x, y, cluster_size=CLUSTER_SIZE, raster_cache=None, neighbours=None):
+    """
+    Samples elevation, slope and aspect from one open raster at many points.
+
+    Points are bucketed into pixel clusters and every cluster is read once as a
+    window covering its points plus a one-pixel halo, so slope and aspect use the
+    same neighbours as a full-raster calculation. Where the halo falls outside the
+    raster, or the window has NoData cells, it is mosaicked with the neighbouring
+    rasters, if given; otherwise slope and aspect on the edge pixels come from
+    one-sided differences and can differ from a seamless mosaic by a fraction of
+    a degree, and are NaN next to NoData.
+
+    Args:
+        src (rasterio.DatasetReader): Open raster.
+        x (np.ndarray): 1D array of x coordinates inside the raster.
+        y (np.ndarray): 1D array of y coordinates inside the raster.
+        cluster_size (int): Cluster edge length in pixels.
+        raster_cache (RasterCache, optional): If given, windows are assembled from its
+                                              cached blocks instead of read from src.
+        neighbours (list, optional): Paths of the rasters adjacent to src, on the same
+                                     CRS and aligned pixel grid, used for halos at its
+                                     edges and to fill its NoData cells.
+
+    Returns:
+        tuple: (elevation, slope, aspect) 1D float64 arrays aligned with x and y.
+               NoData pixels are NaN.
+    """
+    n_points = len(x)
+    elevation = np.full(n_points, np.nan)
+    slope = np.full(n_points, np.nan)
+    aspect = np.full(n_points, np.nan)
+
+    rows, cols = rowcol(src.transform, x, y)
+    rows = np.clip(np.asarray(rows, dtype=np.int64), 0, src.height - 1)
+    cols = np.clip(np.asarray(cols, dtype=np.int64), 0, src.width - 1)
+
+    cluster_keys = (rows // cluster_size) * (src.width // cluster_size + 1) + cols // cluster_size
+    unique_keys, cluster_ids = np.unique(cluster_keys, return_inverse=True)
+    for cluster_id in range(len(unique_keys)):
+        members = np.flatnonzero(cluster_ids == cluster_id)
+        member_rows = rows[members]
+        member_cols = cols[members]
+
+        # Window around the cluster's points, plus a one-pixel halo
+        row_off = member_rows.min() - 1
+        col_off = member_cols.min() - 1
+        row_end = member_rows.max() + 2
+        col_end = member_cols.max() + 2
+        inside = row_off >= 0 and col_off >= 0 and row_end <= src.height and col_end <= src.width
+
+        # Clipped to the raster
+        clipped_row_off, clipped_col_off = max(row_off, 0), max(col_off, 0)
+        window = Window(clipped_col_off, clipped_row_off,
+                        min(col_end, src.width) - clipped_col_off, min(row_end, src.height) - clipped_row_off)
+        if raster_cache is not None:
+            elevation_window = raster_cache.read_window(src.name, window).astype(np.float64)
+        else:
+            elevation_window = src.read(1, window=window).astype(np.float64)
+        if src.nodata is not None:
+            elevation_window[elevation_window == src.nodata] = np.nan
+
+        # Halos past the edge, and NoData cells (e.g. the NaN border of a reprojected
+        # tile), are filled from the neighbours, as read_tile_with_halo does
+        if neighbours and (not inside or np.isnan(elevation_window).any()):
+            # merge takes either all paths or all open datasets
+            if raster_cache is not None:
+                sources = [src] + [raster_cache.open(path) for path in neighbours]
+            else:
+                sources = [src.name] + list(neighbours)
+            elevation_window, row_off, col_off = _read_window_with_neighbours(
+                src, sources, row_off, col_off, row_end, col_end)
+        else:
+            row_off, col_off = clipped_row_off, clipped_col_off
+
+        (elevation[members],
+         slope[members],
+         aspect[members]) = _sample_cluster(src, elevation_window, member_rows, member_cols, row_off, col_off)
+
+    return elevation, slope, aspect
+
+def _find_neighbours(spatial_index, raster_catalogue, raster_info, pixel_size):
+    """Paths of the same-type rasters within one pixel of a raster, itself excluded."""
+    bounds = raster_info['bounds']
+    res_x, res_y = pixel_size
+    expanded_bounds = (bounds.left - res_x, bounds.bottom - res_y, bounds.right + res_x, bounds.top + res_y)
+    neighbours = [raster_catalogue.by_id(i) for i in sorted(spatial_index.intersection(expanded_bounds))
+                  if i != raster_info['id']]
+    return [neighbour['path'] for neighbour in neighbours if neighbour['type'] == raster_info['type']]
+
+def _sample_by_raster(x, y, raster_ids, spatial_index, raster_catalogue, cluster_size, raster_cache):
+    """
+    Samples each point from its given raster, one open per raster.
+
+    Returns:
+        tuple: (elevation, slope, aspect) 1D float64 arrays aligned with x and y.
+    """
+    elevation = np.full(len(x), np.nan)
+    slope = np.full(len(x), np.nan)
+    aspect = np.full(len(x), np.nan)
+    order = np.argsort(raster_ids, kind='stable')
+    unique_ids, starts = np.unique(raster_ids[order], return_index=True)
+    for raster_id, members in zip(unique_ids, np.split(order, starts[1:])):
+        raster_info = raster_catalogue.by_id(raster_id)
+        filepath = raster_info['path']
+        try:
+            if raster_cache is not None:
+                src = raster_cache.open(filepath)
+                neighbours = _find_neighbours(spatial_index, raster_catalogue, raster_info, src.res)
+                sampled = sample_raster_points(src, x[members], y[members], cluster_size, raster_cache, neighbours)
+            else:
+                with rasterio.open(filepath) as src:
+                    neighbours = _find_neighbours(spatial_index, raster_catalogue, raster_info, src.res)
+                    sampled = sample_raster_points(src, x[members], y[members], cluster_size,
+                                                   neighbours=neighbours)
+            elevation[members], slope[members], aspect[members] = sampled
+        except rasterio.errors.RasterioIOError as e:
+            print(f"Error opening or reading raster file {filepath}: {e}")
+    return elevation, slope, aspect
+
+def get_features_at_coordinates(x, y, spatial_index, raster_catalogue, cluster_size=CLUSTER_SIZE,
+                                raster_cache=RASTER_CACHE, raster_types=DEM_RASTER_TYPES):
+    """
+    Samples DEM features at a batch of points through the persistent raster index.
+
+    Each point is matched to the DEM rasters covering it with one bulk R-tree query,
+    points are grouped by raster, and each raster is opened once and read through
+    clustered windows. A point whose elevation, slope or aspect is NaN on its raster
+    (e.g. in the NoData collar of overlapping tiles) is sampled again from its next
+    covering raster, whose values are kept if they are complete.
+    By default dataset handles and decoded blocks come from the process-wide
+    raster cache, so repeated queries over the same area mostly hit memory.
+
+    Args:
+        x (array-like): x coordinates, in the CRS of the indexed rasters.
+        y (array-like): y coordinates, in the CRS of the indexed rasters.
+        spatial_index (rtree.index.Index): Index from indexer.load_raster_index.
+        raster_catalogue (RasterCatalogue): Catalogue from indexer.load_raster_index.
+        cluster_size (int): Cluster edge length in pixels for windowed reads.
+        raster_cache (RasterCache, optional): Cache for handles and blocks; None reads directly.
+        raster_types (list): Catalogue raster types to sample. Defaults to the DEM types.
+
+    Returns:
+        dict: Columnar arrays aligned with the input points:
+              'x', 'y', 'raster_id' (the raster sampled, its NoData filled from its
+              neighbours; -1 if uncovered), 'elevation',
+              'slope', 'aspect'. Features are NaN for uncovered points and where no
+              covering raster has them.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n_points = len(x)
+
+    candidate_ids, counts = find_raster_candidates(spatial_index, x, y, raster_catalogue, raster_types)
+    first = np.cumsum(counts) - counts
+    features = {
+        'x': x,
+        'y': y,
+        'raster_id': np.full(n_points, -1, dtype=np.int64),
+        'elevation': np.full(n_points, np.nan),
+        'slope': np.full(n_points, np.nan),
+        'aspect': np.full(n_points, np.nan),
+    }
+
+    # Try each point's covering rasters in id order until one gives every feature
+    names = ['elevation', 'slope', 'aspect']
+    pending = np.flatnonzero(counts > 0)
+    attempt = 0
+    while len(pending):
+        raster_ids = candidate_ids[first[pending] + attempt]
+        sampled = dict(zip(names, _sample_by_raster(x[pending], y[pending], raster_ids, spatial_index,
+                                                    raster_catalogue, cluster_size, raster_cache)))
+        complete = ~np.any([np.isnan(sampled[name]) for name in names], axis=0)
+        # A retry replaces earlier values if it is complete, or gives a still missing elevation
+        take = (complete | (np.isnan(features['elevation'][pending]) & ~np.isnan(sampled['elevation']))
+                if attempt else np.ones(len(pending), dtype=bool))
+        features['raster_id'][pending[take]] = raster_ids[take]
+        for name in names:
+            features[name][pending[take]] = sampled[name][take]
+        attempt += 1
+        incomplete = np.any([np.isnan(features[name][pending]) for name in names], axis=0)
+        pending = pending[incomplete & (counts[pending] > attempt)]
+
+    return features
+
+def point_dem_versions(x, y, spatial_index, raster_catalogue, raster_types=DEM_RASTER_TYPES):
+    """
+    Version of the DEM data under each point, for invalidating point features.
+
+    It is the XOR of RasterCatalogue.raster_versions() over every DEM raster
+    covering the point (0 if none), so it changes when one of those rasters is
+    rewritten or removed or a new one covers the point, and stays put elsewhere.
+
+    Args:
+        x (array-like): x coordinates, in the CRS of the indexed rasters.
+        y (array-like): y coordinates, in the CRS of the indexed rasters.
+        spatial_index (rtree.index.Index): Index from indexer.load_raster_index.
+        raster_catalogue (RasterCatalogue): Catalogue from indexer.load_raster_index.
+        raster_types (list): Catalogue raster types to consider. Defaults to the DEM types.
+
+    Returns:
+        np.ndarray: 1D int64 array of versions aligned with the input points.
+    """
+    ids, counts = find_raster_candidates(spatial_index, x, y, raster_catalogue, raster_types)
+    versions = np.zeros(len(counts), dtype=np.int64)
+    covered = counts > 0
+    if covered.any():
+        # uncovered points own empty runs, so the covered starts delimit every run
+        starts = (np.cumsum(counts) - counts)[covered]
+        versions[covered] = np.bitwise_xor.reduceat(raster_catalogue.raster_versions(ids), starts)
+    return versions
@@ -0,0 +1,124 @@
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.merge import merge
+from config import OVERVIEW_FACTORS
+
+# How each layer is aggregated into coarser overview levels.
+# Continuous layers are averaged. Aspect is an angle (averaging 359 and 1 gives 180)
+# and flow direction is a code, so both keep a representative source pixel.
+LAYER_RESAMPLING = {
+    'elevation': Resampling.average,
+    'slope': Resampling.average,
+    'curvature': Resampling.average,
+    'hillshade': Resampling.average,
+    'aspect': Resampling.nearest,
+    'flow_direction': Resampling.nearest,
+}
+
+def add_overviews(path, layer='elevation', factors=OVERVIEW_FACTORS):
+    """
+    Builds internal overviews (2x, 4x, 8x, ...) for one raster.
+
+    Args:
+        path (str): Path to the raster (opened in update mode).
+        layer (str): Layer name, a key of LAYER_RESAMPLING.
+        factors (list): Decimation factors. Factors coarser than the raster are skipped.
+
+    Returns:
+        tuple: (path, list of factors built, error message or None)
+    """
+    try:
+        with rasterio.open(path, 'r+') as dst:
+            usable = [f for f in factors if min(dst.width, dst.height) // f >= 1]
+            dst.build_overviews(usable, LAYER_RESAMPLING[layer])
+        return path, usable, None
+    except rasterio.errors.RasterioIOError as e:
+        return path, [], f"Error opening or reading raster file {path}: {e}"
+    except Exception as e:
+        return path, [], f"An unexpected error occurred processing {path}: {e}"
+
+def build_pyramid(paths, layer='elevation', factors=OVERVIEW_FACTORS, max_workers=None):
+    """
+    Builds overviews for many rasters of one layer across a process pool.
+
+    Args:
+        paths (list): Raster paths, e.g. [info['path'] for info in raster_catalogue].
+        layer (str): Layer name, a key of LAYER_RESAMPLING.
+        factors (list): Decimation factors.
+        max_workers (int, optional): Number of processes. Defaults to the CPU count.
+
+    Returns:
+        int: Number of rasters that got overviews.
+    """
+    paths = list(paths)
+    print(f"Building {layer} overviews {factors} for {len(paths)} rasters...")
+    built = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(add_overviews, paths, [layer] * len(paths), [factors] * len(paths))
+        for _, _, error in results:
+            if error is not None:
+                print(error)
+            else:
+                built += 1
+    print(f"Finished building overviews. Rasters processed: {built}")
+    return built
+
+def select_overview_level(src, target_resolution):
+    """
+    Chooses the coarsest overview level whose pixels are no larger than target_resolution.
+
+    Args:
+        src (rasterio.DatasetReader): Open raster (full resolution).
+        target_resolution (float): Requested pixel size, in CRS units.
+
+    Returns:
+        int or None: overview_level to pass to rasterio.open, or None for full resolution.
+    """
+    native_resolution = max(src.res)
+    level = None
+    for i, factor in enumerate(src.overviews(1)):
+        if native_resolution * factor <= target_resolution * (1 + 1e-6):
+            level = i
+    return level
+
+def read_region(spatial_index, raster_catalogue, bounds, resolution, layer='elevation', raster_type=None):
+    """
+    Reads a region at a requested resolution from the coarsest adequate pyramid level.
+
+    Rasters are found through the R-tree index, each one is opened at its coarsest
+    overview level that still meets the resolution, and the pieces are mosaicked
+    onto a grid with the requested pixel size.
+
+    Args:
+        spatial_index (rtree.index.Index): Index from indexer.load_raster_index.
+        raster_catalogue (RasterCatalogue): Catalogue from indexer.load_raster_index.
+        bounds (tuple): (left, bottom, right, top) in the CRS of the rasters.
+        resolution (float): Output pixel size, in CRS units.
+        layer (str): Layer name, selects the resampling from LAYER_RESAMPLING.
+        raster_type (str, optional): Only use rasters of this type.
+
+    Returns:
+        tuple: (2D float32 array with NaN where nothing is covered, affine transform),
+               or (None, None) if no raster intersects the bounds.
+    """
+    raster_ids = sorted(spatial_index.intersection(tuple(bounds)))
+    infos = [raster_catalogue.by_id(i) for i in raster_ids]
+    paths = [info['path'] for info in infos if raster_type is None or info['type'] == raster_type]
+    if not paths:
+        return None, None
+
+    with contextlib.ExitStack() as stack:
+        datasets = []
+        for path in paths:
+            with rasterio.open(path) as src:
+                level = select_overview_level(src, resolution)
+            open_kwargs = {} if level is None else {'overview_level': level}
+            datasets.append(stack.enter_context(rasterio.open(path, **open_kwargs)))
+
+        mosaic, transform = merge(datasets, bounds=tuple(bounds), res=(resolution, resolution),
+                                  nodata=np.nan, dtype='float32', indexes=[1],
+                                  resampling=LAYER_RESAMPLING[layer])
+    return mosaic[0], transform
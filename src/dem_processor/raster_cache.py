@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import rasterio
+
+# Default bounds of the process-wide cache
+MAX_OPEN_DATASETS = 64
+BLOCK_CACHE_BYTES = 256 * 1024 ** 2
+
+class RasterCache:
+    """
+    Two bounded LRU layers shared by every read path in the process:
+
+    - open rasterio dataset handles, keyed by path (at most max_datasets open);
+    - decoded raster blocks, keyed by (path, band, block row, block col),
+      bounded by a total byte budget.
+
+    Repeated reads of the same tiles and blocks (e.g. sampling clustered
+    boreholes) skip the file open, header parse and block decode. Hit and miss
+    counts for both layers are available from stats().
+    """
+
+    def __init__(self, max_datasets=MAX_OPEN_DATASETS, max_block_bytes=BLOCK_CACHE_BYTES):
+        self.max_datasets = max_datasets
+        self.max_block_bytes = max_block_bytes
+        self._datasets = OrderedDict()
+        self._blocks = OrderedDict()
+        self._block_bytes = 0
+        self._lock = threading.RLock()
+        self._counts = {'dataset_hits': 0, 'dataset_misses': 0, 'block_hits': 0, 'block_misses': 0}
+
+    def open(self, path):
+        """Returns a cached open dataset for path, opening (and evicting) as needed."""
+        with self._lock:
+            src = self._datasets.get(path)
+            if src is not None:
+                self._datasets.move_to_end(path)
+                self._counts['dataset_hits'] += 1
+                return src
+            self._counts['dataset_misses'] += 1
+            src = rasterio.open(path)
+            self._datasets[path] = src
+            while len(self._datasets) > self.max_datasets:
+                evicted_path, evicted = self._datasets.popitem(last=False)
+                evicted.close()
+                self._drop_blocks(evicted_path)
+            return src
+
+    def _drop_blocks(self, path):
+        for key in [key for key in self._blocks if key[0] == path]:
+            self._block_bytes -= self._blocks.pop(key).nbytes
+
+    def get_block(self, path, block_row, block_col, band=1):
+        """Returns the decoded block (block_row, block_col) of a band, from cache if possible."""
+        key = (path, band, block_row, block_col)
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+                self._counts['block_hits'] += 1
+                return block
+            self._counts['block_misses'] += 1
+            src = self.open(path)
+            block = src.read(band, window=src.block_window(band, block_row, block_col))
+            block.setflags(write=False)
+            if block.nbytes <= self.max_block_bytes:
+                self._blocks[key] = block
+                self._block_bytes += block.nbytes
+                while self._block_bytes > self.max_block_bytes:
+                    _, evicted = self._blocks.popitem(last=False)
+                    self._block_bytes -= evicted.nbytes
+            return block
+
+    def read_window(self, path, window, band=1):
+        """
+        Reads a window of a band by assembling it from cached blocks.
+
+        Args:
+            path (str): Raster path.
+            window (rasterio.windows.Window): Window inside the raster bounds.
+            band (int): Band index.
+
+        Returns:
+            np.ndarray: 2D array of the window, in the raster's dtype.
+        """
+        src = self.open(path)
+        block_height, block_width = src.block_shapes[band - 1]
+        row_off, col_off = int(window.row_off), int(window.col_off)
+        row_end, col_end = row_off + int(window.height), col_off + int(window.width)
+
+        out = np.empty((row_end - row_off, col_end - col_off), dtype=src.dtypes[band - 1])
+        for block_row in range(row_off // block_height, (row_end - 1) // block_height + 1):
+            for block_col in range(col_off // block_width, (col_end - 1) // block_width + 1):
+                block = self.get_block(path, block_row, block_col, band)
+                block_r0, block_c0 = block_row * block_height, block_col * block_width
+                r0, r1 = max(row_off, block_r0), min(row_end, block_r0 + block.shape[0])
+                c0, c1 = max(col_off, block_c0), min(col_end, block_c0 + block.shape[1])
+                out[r0 - row_off:r1 - row_off, c0 - col_off:c1 - col_off] = \
+                    block[r0 - block_r0:r1 - block_r0, c0 - block_c0:c1 - block_c0]
+        return out
+
+    def stats(self):
+        """Returns hit/miss counts plus the current number of open datasets and cached block bytes."""
+        with self._lock:
+            return {**self._counts, 'open_datasets': len(self._datasets),
+                    'cached_blocks': len(self._blocks), 'cached_block_bytes': self._block_bytes}
+
+    def clear(self):
+        """Closes every cached dataset and drops every cached block."""
+        with self._lock:
+            for src in self._datasets.values():
+                src.close()
+            self._datasets.clear()
+            self._blocks.clear()
+            self._block_bytes = 0
+
+# Process-wide cache used by the read paths by default
+RASTER_CACHE = RasterCache()
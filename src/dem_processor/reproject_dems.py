@@ -0,0 +1,182 @@
+import glob
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import rasterio
+import rasterio.shutil
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.io import MemoryFile
+from rasterio.transform import from_origin
+from rasterio.warp import reproject, transform_bounds
+from archives import list_archive_rasters, archive_of
+from config import (RASTER_DIRS, RASTER_TYPE_PATTERNS, ARCHIVE_PATTERN, OVERVIEW_FACTORS,
+                    TARGET_CRS, TARGET_RESOLUTION_FT, SOURCE_ELEVATION_UNITS)
+
+# Produces the reprojected_dems_wa_south_ft tiles listed in RASTER_DIRS from the
+# downloaded quads (loose files or read in place from the zips).
+
+# --- Configuration ---
+SOURCE_DIR = "../../../soilense_data/DEM/washington_10meter_dem_tiles"
+DESTINATION_DIR = RASTER_DIRS[0]
+MAX_WORKERS = None # Reprojection processes (None = CPU count)
+# ---------------------
+
+# Multipliers from the source vertical units to US survey feet
+US_FEET_PER_UNIT = {
+    'm': 3937 / 1200,
+    'ft': 0.3048 * 3937 / 1200,
+    'us-ft': 1.0,
+}
+
+# Creation options for the cloud-optimized output: 512x512 internal tiles,
+# deflate with the floating-point predictor, and averaged internal overviews
+COG_OPTIONS = {
+    'COMPRESS': 'DEFLATE',
+    'PREDICTOR': 3,
+    'BLOCKSIZE': 512,
+    'OVERVIEWS': 'AUTO',
+    'OVERVIEW_RESAMPLING': 'AVERAGE',
+    'BIGTIFF': 'IF_SAFER',
+}
+
+def target_grid(src, dst_crs, resolution):
+    """
+    Output transform and shape covering a source raster in dst_crs.
+
+    The bounds are snapped outward to multiples of the resolution, so neighbouring
+    tiles land on one shared pixel grid and can be mosaicked without resampling.
+
+    Returns:
+        tuple: (affine transform, width, height)
+    """
+    left, bottom, right, top = transform_bounds(src.crs, dst_crs, *src.bounds, densify_pts=21)
+    left = math.floor(left / resolution) * resolution
+    bottom = math.floor(bottom / resolution) * resolution
+    right = math.ceil(right / resolution) * resolution
+    top = math.ceil(top / resolution) * resolution
+    width = int(round((right - left) / resolution))
+    height = int(round((top - bottom) / resolution))
+    return from_origin(left, top, resolution, resolution), width, height
+
+def output_path_for(source_path, destination_dir):
+    """Output GeoTIFF path for a source raster: <destination_dir>/<source stem>.tif."""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(destination_dir, stem + '.tif')
+
+def _is_up_to_date(source_path, output_path):
+    """An output is current if it was written after its source (or source archive) last changed."""
+    if not os.path.exists(output_path):
+        return False
+    return os.path.getmtime(output_path) >= os.path.getmtime(archive_of(source_path) or source_path)
+
+def reproject_dem(source_path, output_path, dst_crs=TARGET_CRS, resolution=TARGET_RESOLUTION_FT,
+                  source_units=SOURCE_ELEVATION_UNITS, overview_factors=OVERVIEW_FACTORS):
+    """
+    Reprojects one DEM into dst_crs and writes it as a cloud-optimized GeoTIFF.
+
+    Elevations are resampled bilinearly, converted to US survey feet and stored as
+    float32 with NaN nodata. The output is tiled and deflate-compressed, with
+    internal overviews down to the coarsest of overview_factors that fits the tile.
+
+    Args:
+        source_path (str): Source raster path (a regular path or a /vsizip/ path).
+        output_path (str): Output GeoTIFF path. Written to <output_path>.tmp and moved into place.
+        dst_crs (str): Target CRS.
+        resolution (float): Output pixel size, in dst_crs units.
+        source_units (str): Vertical units of the source, a key of US_FEET_PER_UNIT.
+        overview_factors (list): Decimation factors bounding the overview levels.
+
+    Returns:
+        tuple: (output_path, error message or None)
+    """
+    tmp_path = output_path + '.tmp'
+    try:
+        dst_crs = CRS.from_user_input(dst_crs)
+        with rasterio.open(source_path) as src:
+            transform, width, height = target_grid(src, dst_crs, resolution)
+            elevation = np.full((height, width), np.nan, dtype=np.float32)
+            reproject(source=rasterio.band(src, 1), destination=elevation,
+                      src_nodata=src.nodata, dst_transform=transform, dst_crs=dst_crs,
+                      dst_nodata=np.nan, resampling=Resampling.bilinear)
+        elevation *= np.float32(US_FEET_PER_UNIT[source_units])
+
+        profile = {'driver': 'GTiff', 'dtype': 'float32', 'count': 1, 'nodata': np.nan,
+                   'width': width, 'height': height, 'crs': dst_crs, 'transform': transform}
+        levels = sum(1 for f in overview_factors if min(width, height) // f >= 1)
+        overview_options = {'OVERVIEW_COUNT': levels} if levels else {'OVERVIEWS': 'NONE'}
+        with MemoryFile() as memfile:
+            with memfile.open(**profile) as mem:
+                mem.write(elevation, 1)
+                mem.update_tags(1, UNITS='US survey foot')
+            with memfile.open() as mem:
+                rasterio.shutil.copy(mem, tmp_path, driver='COG', **{**COG_OPTIONS, **overview_options})
+        os.replace(tmp_path, output_path)
+        return output_path, None
+    except rasterio.errors.RasterioIOError as e:
+        return output_path, f"Error opening or reading raster file {source_path}: {e}"
+    except Exception as e:
+        return output_path, f"An unexpected error occurred reprojecting {source_path}: {e}"
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def find_source_rasters(source_dir, raster_type_patterns=RASTER_TYPE_PATTERNS, include_archives=True):
+    """Source rasters in source_dir: loose files matching the type patterns plus raster members of zips."""
+    sources = []
+    for pattern in raster_type_patterns.values():
+        sources.extend(glob.glob(os.path.join(source_dir, pattern)))
+    if include_archives:
+        for zip_path in sorted(glob.glob(os.path.join(source_dir, ARCHIVE_PATTERN))):
+            sources.extend(path for path, _ in list_archive_rasters(zip_path, raster_type_patterns))
+    return sorted(set(sources))
+
+def reproject_all_dems(source_dir, destination_dir, max_workers=MAX_WORKERS, dst_crs=TARGET_CRS,
+                       resolution=TARGET_RESOLUTION_FT, source_units=SOURCE_ELEVATION_UNITS,
+                       raster_type_patterns=RASTER_TYPE_PATTERNS, overwrite=False):
+    """
+    Reprojects every source DEM in source_dir into destination_dir across a process pool.
+    Outputs newer than their source are skipped unless overwrite is set.
+
+    Returns:
+        int: Number of rasters reprojected.
+    """
+    if not os.path.exists(destination_dir):
+        os.makedirs(destination_dir)
+        print(f"Created destination directory: {destination_dir}")
+
+    sources = find_source_rasters(source_dir, raster_type_patterns)
+    outputs = [output_path_for(path, destination_dir) for path in sources]
+    pending = [(s, o) for s, o in zip(sources, outputs) if overwrite or not _is_up_to_date(s, o)]
+    print(f"Found {len(sources)} source rasters, {len(sources) - len(pending)} already reprojected.")
+    if len(set(outputs)) < len(outputs):
+        print("Warning: some source rasters share a file name and will overwrite each other's output.")
+
+    reprojected = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        n = len(pending)
+        results = executor.map(reproject_dem, [s for s, _ in pending], [o for _, o in pending],
+                               [dst_crs] * n, [resolution] * n, [source_units] * n)
+        for _, error in results:
+            if error is not None:
+                print(error)
+            else:
+                reprojected += 1
+
+    print("-" * 20)
+    print(f"Finished reprojecting to {dst_crs}. Rasters written: {reprojected} of {len(pending)}")
+    return reprojected
+
+
+if __name__ == "__main__":
+    resolved_source_dir = os.path.abspath(SOURCE_DIR)
+    resolved_destination_dir = os.path.abspath(DESTINATION_DIR)
+    print(f"Resolved source directory: {resolved_source_dir}")
+    print(f"Resolved destination directory: {resolved_destination_dir}")
+    print("-" * 20)
+
+    if not os.path.exists(resolved_source_dir):
+        print(f"Error: Source directory not found at {resolved_source_dir}")
+    else:
+        reproject_all_dems(resolved_source_dir, resolved_destination_dir)
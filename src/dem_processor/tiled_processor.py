@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import rasterio
+from rasterio.merge import merge
+from feature_exractor import compute_terrain_derivatives, TERRAIN_FEATURES
+from pyramid import add_overviews
+
+# Output raster layout: internally tiled and compressed so later windowed reads stay cheap
+OUTPUT_PROFILE = {
+    'driver': 'GTiff',
+    'dtype': 'float32',
+    'count': 1,
+    'nodata': np.nan,
+    'tiled': True,
+    'blockxsize': 256,
+    'blockysize': 256,
+    'compress': 'deflate',
+    'predictor': 3,
+}
+
+def _trim_uncovered_halo(dem_array, halo):
+    """
+    Drops halo rows/columns that no neighbouring tile covers (edge of the mosaic),
+    so the derivative kernel extrapolates there instead of propagating NaN.
+
+    Returns:
+        tuple: (trimmed array, (top, bottom, left, right) halo widths kept)
+    """
+    kept = []
+    for side in ('top', 'bottom', 'left', 'right'):
+        if side == 'top':
+            strip = dem_array[:halo]
+        elif side == 'bottom':
+            strip = dem_array[-halo:]
+        elif side == 'left':
+            strip = dem_array[:, :halo]
+        else:
+            strip = dem_array[:, -halo:]
+        kept.append(0 if np.isnan(strip).all() else halo)
+    top, bottom, left, right = kept
+    rows, cols = dem_array.shape
+    trimmed = dem_array[halo - top:rows - halo + bottom, halo - left:cols - halo + right]
+    return trimmed, (top, bottom, left, right)
+
+def read_tile_with_halo(spatial_index, raster_catalogue, raster_info, halo=1):
+    """
+    Reads one tile plus a halo of `halo` pixels taken from its neighbours.
+
+    Neighbours are found through the R-tree index and only the windows that
+    overlap the halo are read from them. Tiles are assumed to share a CRS and
+    an aligned pixel grid (e.g. the reprojected state-plane tiles).
+
+    Args:
+        spatial_index (rtree.index.Index): Index from indexer.load_raster_index.
+        raster_catalogue (RasterCatalogue): Catalogue from indexer.load_raster_index.
+        raster_info (dict): Raster info dict of the tile to read.
+        halo (int): Halo width in pixels.
+
+    Returns:
+        tuple: (float32 array with NoData as NaN, halo widths kept as (top, bottom, left, right),
+                rasterio profile of the tile)
+    """
+    with rasterio.open(raster_info['path']) as src:
+        profile = src.profile
+        res_x, res_y = src.res
+        bounds = src.bounds
+
+    expanded_bounds = (
+        bounds.left - halo * res_x,
+        bounds.bottom - halo * res_y,
+        bounds.right + halo * res_x,
+        bounds.top + halo * res_y,
+    )
+    neighbour_ids = sorted(spatial_index.intersection(expanded_bounds))
+    # The tile itself goes first so it wins wherever rasters overlap
+    neighbours = [raster_catalogue.by_id(i) for i in neighbour_ids if i != raster_info['id']]
+    sources = [raster_info['path']] + [
+        neighbour['path'] for neighbour in neighbours if neighbour['type'] == raster_info['type']
+    ]
+
+    mosaic, _ = merge(sources, bounds=expanded_bounds, res=(res_x, res_y),
+                      nodata=np.nan, dtype='float32', indexes=[1])
+    dem_array, halo_widths = _trim_uncovered_halo(mosaic[0], halo)
+    return dem_array, halo_widths, profile
+
+def process_tiles_with_halo(spatial_index, raster_catalogue, output_dir, features=None,
+                            halo=1, raster_type=None, overview_factors=None):
+    """
+    Computes terrain derivatives for every indexed tile, seamlessly across tile edges.
+
+    Each tile is read together with a halo from its neighbours, so derivatives at
+    tile edges use real neighbouring elevations instead of one-sided differences.
+    Only one tile (plus halo) is held in memory at a time. Outputs are written to
+    output_dir/<feature>/<tile file name> with the tile's grid and CRS.
+
+    Args:
+        spatial_index (rtree.index.Index): Index from indexer.load_raster_index.
+        raster_catalogue (RasterCatalogue): Catalogue from indexer.load_raster_index.
+        output_dir (str): Root directory for the output rasters.
+        features (list, optional): Layers to compute, from TERRAIN_FEATURES. Defaults to all.
+        halo (int): Halo width in pixels (1 is enough for the 3x3 kernels).
+        raster_type (str, optional): Only process rasters of this type (e.g. 'TIF').
+        overview_factors (list, optional): If given, overviews are built for every output
+                                           raster with the layer's resampling (see pyramid.py).
+
+    Returns:
+        list: Paths of the written output rasters.
+    """
+    features = TERRAIN_FEATURES if features is None else list(features)
+    for feature in features:
+        os.makedirs(os.path.join(output_dir, feature), exist_ok=True)
+
+    written = []
+    tiles = [info for info in raster_catalogue if raster_type is None or info['type'] == raster_type]
+    print(f"Processing {len(tiles)} tiles with a {halo}-pixel halo...")
+    for raster_info in tiles:
+        filepath = raster_info['path']
+        try:
+            dem_array, (top, bottom, left, right), profile = read_tile_with_halo(
+                spatial_index, raster_catalogue, raster_info, halo)
+            terrain = compute_terrain_derivatives(dem_array, profile['transform'].a, features)
+
+            rows, cols = dem_array.shape
+            interior = (slice(top, rows - bottom), slice(left, cols - right))
+            out_profile = {**profile, **OUTPUT_PROFILE}
+            for feature in features:
+                out_path = os.path.join(output_dir, feature, os.path.basename(filepath))
+                if not out_path.lower().endswith('.tif'):
+                    out_path = os.path.splitext(out_path)[0] + '.tif'
+                with rasterio.open(out_path, 'w', **out_profile) as dst:
+                    dst.write(terrain[feature][interior].astype(np.float32, copy=False), 1)
+                if overview_factors:
+                    _, _, error = add_overviews(out_path, feature, overview_factors)
+                    if error is not None:
+                        print(error)
+                written.append(out_path)
+
+        except rasterio.errors.RasterioIOError as e:
+            print(f"Error opening or reading raster file {filepath}: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred processing {filepath}: {e}")
+
+    print(f"Finished processing. Total rasters written: {len(written)}")
+    return written
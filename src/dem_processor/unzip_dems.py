@@ -1,5 +1,11 @@
 import zipfile
 import os
+from concurrent.futures import ProcessPoolExecutor
+from archives import match_raster_members
+from config import RASTER_TYPE_PATTERNS
+
+# Extraction is optional: the indexer and feature extraction read rasters straight
+# from the zips through GDAL /vsizip/ paths. Use this when plain files are needed.
 
 # --- Configuration ---
 # Directory containing your downloaded .zip DEM files
@@ -8,26 +14,61 @@ SOURCE_DIR = "../soilense_data/DEM/washington_10meter_dem_tiles"
 # Directory where the unzipped .tif files should be saved
 # It's good practice to unzip into a subfolder to keep things organized
 DESTINATION_DIR = os.path.join(SOURCE_DIR, "unzipped_dems")
+
+MAX_WORKERS = None # Extraction processes (None = CPU count)
 # ---------------------
 
-def unzip_file(zip_filepath, dest_dir):
-    """Unzips a single zip file to a destination directory."""
+def select_members(zip_ref, raster_type_patterns=RASTER_TYPE_PATTERNS):
+    """
+    Returns the archive members worth extracting: raster members matching the type
+    patterns, plus sidecars that share their name (e.g. .prj, .tfw, .aux.xml).
+    """
+    names = zip_ref.namelist()
+    rasters = [member for member, _ in match_raster_members(names, raster_type_patterns)]
+    stems = {os.path.splitext(member)[0] for member in rasters}
+    return [name for name in names
+            if not name.endswith('/')
+            and (name in rasters or any(name.startswith(stem + '.') for stem in stems))]
+
+def _is_up_to_date(zip_ref, member, dest_dir, archive_mtime):
+    """A member is current if it was extracted after the archive last changed, with the same size."""
+    target = os.path.join(dest_dir, member)
+    if not os.path.exists(target):
+        return False
+    return (os.path.getsize(target) == zip_ref.getinfo(member).file_size
+            and os.path.getmtime(target) >= archive_mtime)
+
+def unzip_file(zip_filepath, dest_dir, raster_type_patterns=RASTER_TYPE_PATTERNS, rasters_only=True):
+    """
+    Unzips a single zip file to a destination directory.
+
+    Only raster members (and their sidecars) are extracted when rasters_only is set,
+    and members already extracted from the current version of the archive are skipped.
+
+    Returns:
+        tuple: (success, number of members extracted, number of members skipped)
+    """
     try:
         with zipfile.ZipFile(zip_filepath, 'r') as zip_ref:
-            print(f"Unzipping: {os.path.basename(zip_filepath)}")
-            # Extract all contents to the destination directory
-            zip_ref.extractall(dest_dir)
-            print(f"Successfully unzipped to {dest_dir}")
-            return True
+            members = select_members(zip_ref, raster_type_patterns) if rasters_only else \
+                [name for name in zip_ref.namelist() if not name.endswith('/')]
+            archive_mtime = os.path.getmtime(zip_filepath)
+            pending = [m for m in members if not _is_up_to_date(zip_ref, m, dest_dir, archive_mtime)]
+            if pending:
+                print(f"Unzipping {len(pending)} of {len(members)} members: {os.path.basename(zip_filepath)}")
+                for member in pending:
+                    zip_ref.extract(member, dest_dir)
+            return True, len(pending), len(members) - len(pending)
     except zipfile.BadZipFile:
         print(f"Error: {os.path.basename(zip_filepath)} is not a valid zip file.")
-        return False
+        return False, 0, 0
     except Exception as e:
         print(f"An error occurred while unzipping {os.path.basename(zip_filepath)}: {e}")
-        return False
+        return False, 0, 0
 
-def unzip_all_zips_in_directory(source_dir, destination_dir):
-    """Finds all .zip files in a directory and unzips them."""
+def unzip_all_zips_in_directory(source_dir, destination_dir, max_workers=MAX_WORKERS,
+                                raster_type_patterns=RASTER_TYPE_PATTERNS, rasters_only=True):
+    """Finds all .zip files in a directory and unzips them in parallel, selectively."""
 
     # Ensure the destination directory exists
     if not os.path.exists(destination_dir):
@@ -38,22 +79,27 @@ def unzip_all_zips_in_directory(source_dir, destination_dir):
 
     print(f"Searching for .zip files in: {source_dir}")
     files_found = os.listdir(source_dir)
-    zip_count = 0
+    # Check if it's a file and ends with .zip (case-insensitive check is safer)
+    zip_paths = [os.path.join(source_dir, filename) for filename in files_found
+                 if filename.lower().endswith('.zip') and os.path.isfile(os.path.join(source_dir, filename))]
+    zip_count = len(zip_paths)
     unzipped_count = 0
+    extracted_total = 0
+    skipped_total = 0
 
-    for filename in files_found:
-        # Construct the full path to the file
-        filepath = os.path.join(source_dir, filename)
-
-        # Check if it's a file and ends with .zip (case-insensitive check is safer)
-        if os.path.isfile(filepath) and filename.lower().endswith('.zip'):
-            zip_count += 1
-            if unzip_file(filepath, destination_dir):
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(unzip_file, zip_paths, [destination_dir] * zip_count,
+                               [raster_type_patterns] * zip_count, [rasters_only] * zip_count)
+        for success, extracted, skipped in results:
+            if success:
                 unzipped_count += 1
+            extracted_total += extracted
+            skipped_total += skipped
 
     print("-" * 20)
     print(f"Finished checking directory. Found {zip_count} .zip files.")
     print(f"Attempted to unzip {zip_count} files, {unzipped_count} were successfully processed.")
+    print(f"Members extracted: {extracted_total}, already up to date: {skipped_total}")
 
 
 if __name__ == "__main__":
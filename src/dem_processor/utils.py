@@ -22,27 +22,6 @@ def handle_dem_nodata(dem_array: List[List], nodata_value: float, logger: Logger
         logger.info("No explicit NoData value found in raster metadata. Proceeding without handling.")
     return dem_array_handled
 
-def get_features_at_coordinates(coordinates):
-    features = []
-    for coord in coordinates:
-        grid_bounds = find_grid_bounds(coord)
-        relevant_dem_ids = set()
-        for grid_id in grid_bounds:
-            relevant_dem_ids.update(grid_to_dem[grid_id])
-
-        for dem_id in relevant_dem_ids:
-            # Fetch and process the DEM data
-            slope, other_features = fetch_and_process_dem(dem_files[dem_id], coord)
-            features.append((slope, other_features))
-
-    return features
-
-def find_grid_bounds(coord):
-    minx, miny = coord
-    grid_bounds = [(minx + i * cell_size, miny + j * cell_size, minx + (i + 1) * cell_size, miny + (j + 1) * cell_size)
-                  for i in range(int((maxx - minx) / cell_size)) for j in range(int((maxy - miny) / cell_size))]
-    return grid_bounds
-
 def get_dem_info(dem_path=None, dataset=None):
     """
     Retrieves and prints information about a DEM's scale and units.
@@ -1,8 +1,8 @@
-from enum import Enums
+from enum import Enum
 
-class DigitalElevationModelFeatures(Enums):
+class DigitalElevationModelFeatures(Enum):
     ELEVATION_FT = "ELEVATION_FT"
     SLOPE_DEGREE = "SLOPE_DEGREE"
     ASPECT_DEGREE = "ASPECT_DEGREE"
     ASPECT_COS = "ASPECT_COS"
-    ASPECt_SIN = "ASPECT_SIN"
\ No newline at end of file
+    ASPECT_SIN = "ASPECT_SIN"
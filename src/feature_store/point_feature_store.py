@@ -0,0 +1,222 @@
+import os
+import numpy as np
+import pandas as pd
+from feature_store.digital_elevation_model_features import DigitalElevationModelFeatures
+
+FEATURE_STORE_FILE = "dem_point_features.parquet"
+KEY_RESOLUTION_FT = 0.01  # Points closer than this (state-plane feet) share one entry
+
+KEY_COLUMNS = ['x_key', 'y_key']
+VERSION_COLUMN = 'dem_version'  # Version of the DEM rasters covering the point
+COMPUTED_COLUMN = 'computed'  # Bit i set = FEATURE_COLUMNS[i] has been computed
+FEATURE_COLUMNS = [feature.value for feature in DigitalElevationModelFeatures]
+
+def point_keys(x, y, resolution=KEY_RESOLUTION_FT):
+    """Integer grid keys of projected coordinates, rounded to the key resolution."""
+    x_key = np.round(np.asarray(x, dtype=np.float64) / resolution).astype(np.int64)
+    y_key = np.round(np.asarray(y, dtype=np.float64) / resolution).astype(np.int64)
+    return x_key, y_key
+
+def _feature_names(features):
+    if features is None:
+        return list(FEATURE_COLUMNS)
+    return [DigitalElevationModelFeatures(feature).value for feature in features]
+
+def _feature_bits(names):
+    return sum(1 << FEATURE_COLUMNS.index(name) for name in names)
+
+def dem_features_from_samples(samples):
+    """
+    Converts point samples to feature store columns.
+
+    Args:
+        samples (dict): Output of point_sampler.get_features_at_coordinates
+            ('elevation' in feet, 'slope' and 'aspect' in degrees).
+
+    Returns:
+        dict: Arrays keyed by DigitalElevationModelFeatures values.
+    """
+    aspect = np.asarray(samples['aspect'], dtype=np.float64)
+    aspect_radians = np.radians(aspect)
+    return {
+        DigitalElevationModelFeatures.ELEVATION_FT.value: np.asarray(samples['elevation']),
+        DigitalElevationModelFeatures.SLOPE_DEGREE.value: np.asarray(samples['slope']),
+        DigitalElevationModelFeatures.ASPECT_DEGREE.value: aspect,
+        DigitalElevationModelFeatures.ASPECT_COS.value: np.cos(aspect_radians),
+        DigitalElevationModelFeatures.ASPECT_SIN.value: np.sin(aspect_radians),
+    }
+
+class PointFeatureStore:
+    """
+    Materialized DEM features for borehole and sample points, stored as Parquet.
+
+    Rows are keyed by projected coordinates (rounded to KEY_RESOLUTION_FT) and
+    record the version of the DEM rasters covering the point when it was computed
+    (point_sampler.point_dem_versions). On load every row is checked against the
+    current version at its point, so rewriting, adding or removing a tile only
+    invalidates the points on that tile. A stale row reads as missing and is
+    recomputed in full on the next put. A per-row bitmask records which features
+    have been computed, so a feature that is legitimately NaN (a point outside DEM
+    coverage) is not recomputed on every run.
+    """
+
+    def __init__(self, path, dem_versions):
+        """
+        Args:
+            path (str): Parquet file of the store; created on save if missing.
+            dem_versions (callable): dem_versions(x, y) -> int64 DEM version of each point, e.g.
+                lambda x, y: point_dem_versions(x, y, spatial_index, raster_catalogue).
+        """
+        self.path = path
+        self.dem_versions = dem_versions
+        if os.path.exists(path):
+            table = pd.read_parquet(path)
+        else:
+            table = pd.DataFrame({
+                **{column: np.array([], dtype=np.int64) for column in KEY_COLUMNS + [VERSION_COLUMN]},
+                COMPUTED_COLUMN: np.array([], dtype=np.int64),
+                **{column: np.array([], dtype=np.float32) for column in FEATURE_COLUMNS},
+            })
+        self._table = table.set_index(KEY_COLUMNS)
+        # Row is up to date with the DEM rasters under it
+        self._current = np.ones(len(table), dtype=bool)
+        if len(table):
+            x = table[KEY_COLUMNS[0]].to_numpy() * KEY_RESOLUTION_FT
+            y = table[KEY_COLUMNS[1]].to_numpy() * KEY_RESOLUTION_FT
+            self._current = self.dem_versions(x, y) == table[VERSION_COLUMN].to_numpy()
+
+    def __len__(self):
+        return len(self._table)
+
+    def _positions(self, x, y):
+        """Row position of every point in the table, -1 where it has no row."""
+        x_key, y_key = point_keys(x, y)
+        keys = pd.MultiIndex.from_arrays([x_key, y_key], names=KEY_COLUMNS)
+        return self._table.index.get_indexer(keys), keys
+
+    def missing(self, x, y, features=None):
+        """
+        Flags points that need computing: no row, stale DEM rasters under it, or one
+        of the requested features not computed yet.
+
+        Returns:
+            np.ndarray: Boolean mask aligned with the input points.
+        """
+        positions, _ = self._positions(x, y)
+        found = positions >= 0
+        rows = positions[found]
+        needed = _feature_bits(_feature_names(features))
+        current = self._current[rows]
+        complete = (self._table[COMPUTED_COLUMN].to_numpy()[rows] & needed) == needed
+        result = np.ones(len(positions), dtype=bool)
+        result[found] = ~(current & complete)
+        return result
+
+    def get(self, x, y, features=None):
+        """
+        Batch lookup of stored features.
+
+        Args:
+            x (array-like): Projected x coordinates (state-plane feet).
+            y (array-like): Projected y coordinates.
+            features (list, optional): DigitalElevationModelFeatures (or their values). Defaults to all.
+
+        Returns:
+            pd.DataFrame: One row per input point, in input order. Features are NaN
+                          where missing, stale or not computed.
+        """
+        names = _feature_names(features)
+        positions, _ = self._positions(x, y)
+        found = positions >= 0
+        rows = positions[found]
+        current = self._current[rows]
+        computed = self._table[COMPUTED_COLUMN].to_numpy()[rows]
+        result = pd.DataFrame(np.nan, index=pd.RangeIndex(len(positions)), columns=names, dtype=np.float32)
+        for name in names:
+            stored = self._table[name].to_numpy()[rows]
+            usable = current & ((computed & _feature_bits([name])) > 0)
+            result.loc[found, name] = np.where(usable, stored, np.float32(np.nan))
+        return result
+
+    def put(self, x, y, values):
+        """
+        Batch upsert of computed features.
+
+        Args:
+            x (array-like): Projected x coordinates.
+            y (array-like): Projected y coordinates.
+            values (dict): Feature arrays aligned with the points, keyed by
+                           DigitalElevationModelFeatures (or their values).
+        """
+        values = {DigitalElevationModelFeatures(name).value: np.asarray(column, dtype=np.float32)
+                  for name, column in values.items()}
+        names = list(values)
+        positions, keys = self._positions(x, y)
+        # last write wins for points sharing a key within the batch
+        unique = ~keys.duplicated(keep='last')
+        positions, keys = positions[unique], keys[unique]
+        values = {name: column[unique] for name, column in values.items()}
+        bits = _feature_bits(names)
+        # versions at the key coordinates, as they are checked on load
+        versions = self.dem_versions(keys.get_level_values(0).to_numpy() * KEY_RESOLUTION_FT,
+                                     keys.get_level_values(1).to_numpy() * KEY_RESOLUTION_FT)
+
+        found = positions >= 0
+        if found.any():
+            rows = positions[found]
+            table = self._table
+            stale = ~self._current[rows]
+            if stale.any():
+                table.iloc[rows[stale], table.columns.get_indexer(FEATURE_COLUMNS)] = np.nan
+            computed = np.where(stale, 0, table[COMPUTED_COLUMN].to_numpy()[rows]) | bits
+            table.iloc[rows, table.columns.get_loc(COMPUTED_COLUMN)] = computed
+            table.iloc[rows, table.columns.get_loc(VERSION_COLUMN)] = versions[found]
+            self._current[rows] = True
+            for name in names:
+                table.iloc[rows, table.columns.get_loc(name)] = values[name][found]
+
+        if (~found).any():
+            new_rows = pd.DataFrame(np.nan, index=keys[~found], columns=self._table.columns)
+            new_rows = new_rows.astype({column: np.float32 for column in FEATURE_COLUMNS})
+            new_rows[VERSION_COLUMN] = versions[~found]
+            new_rows[COMPUTED_COLUMN] = np.int64(bits)
+            for name in names:
+                new_rows[name] = values[name][~found]
+            self._table = pd.concat([self._table, new_rows]) if len(self._table) else new_rows
+            self._current = np.concatenate([self._current, np.ones(len(new_rows), dtype=bool)])
+
+    def get_or_compute(self, x, y, compute, features=None):
+        """
+        Returns features for every point, computing only missing or stale ones.
+
+        Args:
+            x (array-like): Projected x coordinates.
+            y (array-like): Projected y coordinates.
+            compute (callable): compute(x, y) -> dict of feature arrays for the given points,
+                e.g. lambda x, y: dem_features_from_samples(
+                         get_features_at_coordinates(x, y, spatial_index, raster_catalogue)).
+            features (list, optional): Features to return. Defaults to all.
+
+        Returns:
+            pd.DataFrame: As get().
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        pending = self.missing(x, y, features)
+        if pending.any():
+            _, keys = self._positions(x[pending], y[pending])
+            first = ~keys.duplicated()
+            px, py = x[pending][first], y[pending][first]
+            print(f"Computing DEM features for {len(px)} of {len(x)} points "
+                  f"({len(x) - pending.sum()} already stored).")
+            self.put(px, py, compute(px, py))
+        return self.get(x, y, features)
+
+    def save(self, prune_stale=True):
+        """Writes the store to a temporary file and moves it into place, dropping stale rows by default."""
+        table = self._table
+        if prune_stale:
+            table = table[self._current]
+        tmp_path = self.path + '.tmp'
+        table.reset_index().to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
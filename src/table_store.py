@@ -0,0 +1,177 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# Labels are dictionary-encoded (pandas Categorical), coordinates and measurements
+# float32, and IDs / layer and test numbers integers
+LABEL = pa.dictionary(pa.int32(), pa.string())
+
+SCHEMAS = {
+    # u_mich_archive: file_2_reUSCS.csv
+    'layers_uscs': pa.schema([
+        ('Borehole ID', pa.int64()),
+        ('Sub Borehole Layer', pa.int32()),
+        ('Top Depth', pa.float32()),
+        ('Bottom Depth', pa.float32()),
+        ('USCS', LABEL),
+    ]),
+    # data/u_mich_archive/boreholes_reuscs_sptn.csv
+    'boreholes_uscs_sptn': pa.schema([
+        ('Borehole ID', pa.int64()),
+        ('Latitude', pa.float32()),
+        ('Longitude', pa.float32()),
+        ('Elevation (ft)', pa.float32()),
+        ('In-situ Test #', pa.int32()),
+        ('Test Elevation (ft)', pa.float32()),
+        ('SPTN', pa.float32()),
+        ('Layer #', pa.int32()),
+        ('Layer Top Elevation (ft)', pa.float32()),
+        ('Layer Bottom Elevation (ft)', pa.float32()),
+        ('Soil Description', pa.string()),
+        ('Lithology', LABEL),
+        ('USCS', LABEL),
+        ('Density / Consistency', LABEL),
+    ]),
+    # data/lithology_training_points.csv
+    'lithology_points': pa.schema([
+        ('Latitude', pa.float32()),
+        ('Longitude', pa.float32()),
+        ('Midpoint Elevation (ft)', pa.float32()),
+        ('Lithology', LABEL),
+    ]),
+    # data/sptn_point_data.csv
+    'sptn_points': pa.schema([
+        ('Latitude', pa.float32()),
+        ('Longitude', pa.float32()),
+        ('Test Elevation (ft)', pa.float32()),
+        ('SPTN', pa.float32()),
+    ]),
+}
+
+FORMATS = ('parquet', 'feather')
+
+def to_arrow(df: pd.DataFrame, table: str) -> pa.Table:
+    """
+    Convert a DataFrame to an Arrow table with the explicit schema of a known table.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame holding at least the schema's columns (extra columns are dropped).
+    table : str
+        Table name, a key of SCHEMAS.
+
+    Returns
+    -------
+    pa.Table
+        The table, with columns in schema order and missing values as nulls.
+    """
+    schema = SCHEMAS[table]
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+def write_table(
+        df: pd.DataFrame,
+        path: str,
+        table: str,
+        partition_cols: list | None = None,
+        file_format: str = 'parquet'
+        ) -> None:
+    """
+    Write a DataFrame as typed Parquet or Feather.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Data to write.
+    path : str
+        Output file, or a directory when partition_cols is given.
+    table : str
+        Table name, a key of SCHEMAS.
+    partition_cols : list, optional
+        Columns to partition by (hive-style directories, e.g. USCS=SM/). Readers
+        skip whole partitions that a filter excludes.
+    file_format : str, optional
+        'parquet' (default) or 'feather'.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown file format {file_format!r}, expected one of {FORMATS}")
+    arrow_table = to_arrow(df, table)
+    if partition_cols:
+        ds.write_dataset(arrow_table, path, format=file_format, partitioning=partition_cols,
+                         partitioning_flavor='hive', existing_data_behavior='delete_matching')
+    elif file_format == 'parquet':
+        pq.write_table(arrow_table, path, compression='zstd')
+    else:
+        feather.write_feather(arrow_table, path, compression='zstd')
+
+def read_table(
+        path: str,
+        table: str,
+        columns: list | None = None,
+        filters=None,
+        file_format: str = 'parquet'
+        ) -> pd.DataFrame:
+    """
+    Read a typed table, loading only the requested columns and rows.
+
+    Parameters
+    ----------
+    path : str
+        File or partitioned directory written by write_table.
+    table : str
+        Table name, a key of SCHEMAS.
+    columns : list, optional
+        Columns to load. Defaults to all.
+    filters : list or pyarrow.dataset.Expression, optional
+        Row filter, either an Arrow expression or DNF tuples as in pandas.read_parquet,
+        e.g. [('USCS', 'in', ['SM', 'SP']), ('SPTN', '>=', 10)]. It is pushed down to
+        partition pruning and Parquet row-group statistics, so excluded data is not read.
+    file_format : str, optional
+        'parquet' (default) or 'feather'.
+
+    Returns
+    -------
+    pd.DataFrame
+        Frame with the schema's dtypes: labels as Categorical, floats as float32.
+    """
+    schema = SCHEMAS[table]
+    if isinstance(filters, list):
+        filters = pq.filters_to_expression(filters)
+    # the files carry their Arrow schema; only hive partition values need type inference
+    partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+    dataset = ds.dataset(path, format=file_format, partitioning=partitioning)
+    result = dataset.to_table(columns=columns or schema.names, filter=filters)
+    return result.cast(pa.schema([schema.field(name) for name in result.column_names])).to_pandas()
+
+def convert_csv(
+        csv_path: str,
+        out_path: str,
+        table: str,
+        partition_cols: list | None = None,
+        file_format: str = 'parquet'
+        ) -> pd.DataFrame:
+    """Convert one of the pipeline's CSV tables to typed storage. Returns the typed frame."""
+    df = pd.read_csv(csv_path)
+    write_table(df, out_path, table, partition_cols, file_format)
+    return read_table(out_path, table, file_format=file_format)
+
+
+if __name__ == "__main__":
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+    conversions = [
+        ('lithology_training_points.csv', 'lithology_training_points.parquet', 'lithology_points'),
+        ('sptn_point_data.csv', 'sptn_point_data.parquet', 'sptn_points'),
+        (os.path.join('u_mich_archive', 'boreholes_reuscs_sptn.csv'),
+         os.path.join('u_mich_archive', 'boreholes_reuscs_sptn.parquet'), 'boreholes_uscs_sptn'),
+    ]
+    for csv_name, out_name, table in conversions:
+        csv_path = os.path.join(data_dir, csv_name)
+        if not os.path.exists(csv_path):
+            print(f"Skipping missing table {csv_path}")
+            continue
+        df = convert_csv(csv_path, os.path.join(data_dir, out_name), table)
+        print(f"{csv_name} -> {out_name}: {len(df)} rows, "
+              f"{df.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB in memory")
@@ -1,3 +1,8 @@
+import hashlib
+import json
+import os
+import re
+import numpy as np
 import pandas as pd
 import spacy
 from nltk.stem import WordNetLemmatizer
@@ -7,9 +12,15 @@ import nltk
 # import
 path_import='./Data/Data_raw/file_2.csv'
 path_export='./Data/Data_result/file_2_reUSCS.csv'
+# labels of every (lithology, description) already classified, reused across runs
+path_cache='./Data/Data_result/file_2_reUSCS_cache.json'
 
-f2=pd.read_csv(path_import)
-f2.dropna(subset=['Lithology'], inplace=True)
+# spaCy: similarity only uses the model's static word vectors, so every trained
+# component is left out and descriptions are just tokenized, in batches
+spacy_model = "en_core_web_md"
+spacy_unused_pipes = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner", "senter"]
+spacy_batch_size = 1000
+spacy_n_process = 4
 
 # mapping dict
 uscs_mapping_o = {
@@ -101,52 +112,150 @@ nltk.download("punkt")
 nltk.download("wordnet")
 
 lemmatizer = WordNetLemmatizer()
-nlp = spacy.load("en_core_web_md")
+nlp = spacy.load(spacy_model, exclude=spacy_unused_pipes)
 
 def lemmatize_plurals_only(text):
     words = word_tokenize(text)
     lemmatized_words = [lemmatizer.lemmatize(word, pos='n') for word in words]
     return " ".join(lemmatized_words)
 
-def match_comprehensive(description, lithology, standards, tbd_standards, other_standards, map_standards):
-    description = description.lower()
-    description = lemmatize_plurals_only(description)
+def normalize_description(description):
+    return lemmatize_plurals_only(str(description).lower())
+
+def normalize_rows(vectors):
+    norms=np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+# rule texts are fixed, so their vectors are built once: one unit-length row per
+# USCS code, in dict_uscsRules_keyword order (the order ties resolve in)
+def build_candidate_matrix(standards):
+    codes=list(standards)
+    docs=nlp.pipe('; '.join(standards[u]["ukeywords"] + standards[u]["keywords"]).lower() for u in codes)
+    return codes, normalize_rows(np.stack([doc.vector for doc in docs]))
+
+uscs_codes, candidate_matrix = build_candidate_matrix(dict_uscsRules_keyword)
+
+# every ukeyword/keyword phrase compiled into one alternation, longest first. The
+# lookahead tries each position once and yields the longest phrase starting there;
+# any shorter phrase starting at the same position is a prefix of it.
+def compile_rule_matcher(standards):
+    phrases=sorted({w for rule in standards.values() for w in rule["ukeywords"] + rule["keywords"]},
+                   key=len, reverse=True)
+    pattern=re.compile('(?=(' + '|'.join(re.escape(p) for p in phrases) + '))')
+    prefixes={p: {q for q in phrases if p.startswith(q)} for p in phrases}
+    return pattern, prefixes
+
+rule_matcher = compile_rule_matcher(dict_uscsRules_keyword)
+
+def find_rule_phrases(description, matcher=rule_matcher):
+    pattern, prefixes = matcher
+    hits=set()
+    for m in pattern.finditer(description):
+        hits |= prefixes[m.group(1)]
+    return hits
+
+def match_rules(description, lithology, standards, tbd_standards, other_standards, map_standards):
+    # description is already normalized (see normalize_description).
+    # returns (label, None) when the rules decide, else (None, candidate codes to score)
     lithology = lithology.lower()
     if lithology in map_standards.keys():
-        return map_standards[lithology]
+        return map_standards[lithology], None
     elif lithology in other_standards:
-        return "other"
+        return "other", None
     elif lithology in tbd_standards.keys():
         uscs_backups=tbd_standards[lithology]
-        uscs_backups_re=[]
+        # one scan of the description finds every rule phrase; a ukeywords hit wins outright
+        hits=find_rule_phrases(description)
         for u in uscs_backups:
-            for word in standards[u]["ukeywords"]:
-                if word in description:
-                    return u
-            for word in standards[u]["keywords"]:
-                if word in description:
-                    uscs_backups_re.append(u)
+            if not hits.isdisjoint(standards[u]["ukeywords"]):
+                return u, None
+        uscs_backups_re=[u for u in uscs_backups if not hits.isdisjoint(standards[u]["keywords"])]
         if uscs_backups_re==[]: uscs_backups_re=uscs_backups
-        uscs_scores={u:0 for u in uscs_backups_re}
-        for u in uscs_backups_re:
-            std_full_list=standards[u]["ukeywords"] + standards[u]["keywords"]
-            stf_full='; '.join(std_full_list)
-            stf_full=stf_full.lower()
-            stf_full_nlp=nlp(stf_full)
-            description_nlp=nlp(description)
-            uscs_scores[u]=stf_full_nlp.similarity(description_nlp)
-        return max(uscs_scores, key=uscs_scores.get)
+        return None, uscs_backups_re
     else:
-        return "incorrect"
+        return "incorrect", None
+
+def score_candidates(descriptions, candidates, batch_size=spacy_batch_size, n_process=spacy_n_process):
+    # cosine similarity of every distinct description against every code in one matmul,
+    # masked to each row's allowed candidates; the best remaining code wins
+    text_index, texts = pd.factorize(pd.Series(descriptions))
+    docs=nlp.pipe(texts.tolist(), batch_size=batch_size, n_process=n_process)
+    text_vectors=normalize_rows(np.stack([doc.vector for doc in docs]))
+    scores=(text_vectors @ candidate_matrix.T)[text_index]
 
-def match_map(row):
-    return match_comprehensive(row["Description"], row["Lithology"], dict_uscsRules_keyword, tbd_categories, other_categories, uscs_mapping)
+    code_index={u: i for i, u in enumerate(uscs_codes)}
+    allowed=np.zeros(scores.shape, dtype=bool)
+    rows=np.repeat(np.arange(len(candidates)), [len(c) for c in candidates])
+    cols=[code_index[u] for c in candidates for u in c]
+    allowed[rows, cols]=True
+    best=np.where(allowed, scores, -np.inf).argmax(axis=1)
+    return [uscs_codes[i] for i in best]
+
+def classify_layers(df, batch_size=spacy_batch_size, n_process=spacy_n_process):
+    descriptions=df['Description'].map(normalize_description).tolist()
+    results=[match_rules(d, l, dict_uscsRules_keyword, tbd_categories, other_categories, uscs_mapping)
+             for d, l in zip(descriptions, df['Lithology'])]
+    labels=[label for label, _ in results]
+    pending=[i for i, (label, _) in enumerate(results) if label is None]
+    if pending:
+        scored=score_candidates([descriptions[i] for i in pending], [results[i][1] for i in pending],
+                                batch_size, n_process)
+        for i, label in zip(pending, scored):
+            labels[i]=label
+    return labels
+
+# classification cache: keyed by lowercased lithology and lowercased, whitespace-collapsed
+# description (both are lowercased and tokenized before classifying anyway). The version
+# hashes the rule tables and the spaCy model, so editing either discards old labels.
+def rules_version():
+    payload={"rules": dict_uscsRules_keyword, "tbd": tbd_categories, "other": sorted(other_categories),
+             "map": uscs_mapping, "model": spacy_model, "model_version": nlp.meta.get("version")}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def cache_key(description, lithology):
+    return lithology.lower() + '\x1f' + ' '.join(str(description).lower().split())
+
+def load_cache(path, version):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            cache=json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error loading classification cache {path}, starting a new one: {e}")
+        return {}
+    if cache.get("version") != version:
+        print("Rule tables or spaCy model changed, discarding the classification cache.")
+        return {}
+    return cache["labels"]
+
+def save_cache(path, version, labels):
+    tmp_path=path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({"version": version, "labels": labels}, f)
+    os.replace(tmp_path, path)
+
+def classify_layers_cached(df, path=path_cache, batch_size=spacy_batch_size, n_process=spacy_n_process):
+    version=rules_version()
+    labels=load_cache(path, version)
+    keys=pd.Series([cache_key(d, l) for d, l in zip(df['Description'], df['Lithology'])], index=df.index)
+    # one representative row per distinct key that has not been classified yet
+    new=df[~keys.duplicated() & ~keys.isin(labels.keys())]
+    print(f"{keys.nunique()} distinct descriptions, {len(new)} to classify, the rest cached.")
+    if len(new):
+        labels.update(zip(keys[new.index], classify_layers(new, batch_size, n_process)))
+        save_cache(path, version, labels)
+    return keys.map(labels).tolist()
 
 # apply & cleanup
-f2['USCSre_desc']=f2.apply(match_map, axis=1)
-f2['USCSre_desc']=f2['Lithology'].map(dictlith_other).fillna(f2['USCSre_desc'])
+if __name__ == "__main__":
+    f2=pd.read_csv(path_import)
+    f2.dropna(subset=['Lithology'], inplace=True)
+
+    f2['USCSre_desc']=classify_layers_cached(f2)
+    f2['USCSre_desc']=f2['Lithology'].map(dictlith_other).fillna(f2['USCSre_desc'])
 
-f2=f2[f2['USCSre_desc'] != 'incorrect']
-f2=f2[['Borehole ID', 'Sub Borehole Layer', 'Top Depth', 'Bottom Depth', 'USCSre_desc']]
-f2.columns=['Borehole ID', 'Sub Borehole Layer', 'Top Depth', 'Bottom Depth', 'USCS']
-f2.to_csv(path_export, index=False)
+    f2=f2[f2['USCSre_desc'] != 'incorrect']
+    f2=f2[['Borehole ID', 'Sub Borehole Layer', 'Top Depth', 'Bottom Depth', 'USCSre_desc']]
+    f2.columns=['Borehole ID', 'Sub Borehole Layer', 'Top Depth', 'Bottom Depth', 'USCS']
+    f2.to_csv(path_export, index=False)
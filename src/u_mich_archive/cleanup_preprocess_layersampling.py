@@ -20,31 +20,41 @@ f2['Total Depth'] = f2['Total Depth'].abs()
 f2.drop(columns=['Sub Borehole Layer', 'Description', 'Lithology'], inplace=True, axis=1)
 
 # sampling
-def generate_sampling_depths(top, bottom, total, grid=4):
+# a layer gets 1 sample if it is at most sampling_policy[0] grid cells thick,
+# 2 if at most sampling_policy[1] cells, and 3 otherwise
+sampling_grid=4
+sampling_policy=(2, 4)
+
+def generate_sampling_depths(top, bottom, total, grid=sampling_grid, policy=sampling_policy):
     top=min(top, bottom)
     bottom=max(top, bottom)
-    if total<=2*grid:
+    if total<=policy[0]*grid:
         return [(top+bottom)/2]
-    elif total <= 4*grid:
+    elif total <= policy[1]*grid:
         return [(2*top+bottom)/3, (top+2*bottom)/3]
     else:
         return [top+grid, (top+bottom)/2, bottom-grid]
 
-expanded_data = []
-
-for _, row in f2.iterrows():
-    borehole_id = row['Borehole ID']
-    top_depth = row['Top Depth']
-    bottom_depth = row['Bottom Depth']
-    uscs = row['USCS']
-    total_depth = row['Total Depth']
-    
-    sampling_depths = generate_sampling_depths(top_depth, bottom_depth, total_depth)
-    
-    for depth in sampling_depths:
-        expanded_data.append({'Borehole ID': borehole_id, 'Sampling Depth': depth, 'USCS': uscs})
-
-df_expanded = pd.DataFrame(expanded_data)
+def expand_sampling_depths(layers, grid=sampling_grid, policy=sampling_policy):
+    # vectorized generate_sampling_depths over every layer: one output row per sample
+    # as in generate_sampling_depths, max(min(top, bottom), bottom) is always bottom
+    bottom=layers['Bottom Depth'].to_numpy(dtype=float)
+    top=np.minimum(layers['Top Depth'].to_numpy(dtype=float), bottom)
+    total=layers['Total Depth'].to_numpy(dtype=float)
+    counts=np.select([total <= policy[0]*grid, total <= policy[1]*grid], [1, 2], 3)
+
+    rows=np.repeat(np.arange(len(layers)), counts)
+    k=np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts) # sample number within its layer
+    t, b, n = top[rows], bottom[rows], counts[rows]
+    depths=np.select(
+        [n == 1, (n == 2) & (k == 0), n == 2, k == 0, k == 1],
+        [(t+b)/2, (2*t+b)/3, (t+2*b)/3, t+grid, (t+b)/2],
+        b-grid)
+    return pd.DataFrame({'Borehole ID': layers['Borehole ID'].to_numpy()[rows],
+                         'Sampling Depth': depths,
+                         'USCS': layers['USCS'].to_numpy()[rows]})
+
+df_expanded = expand_sampling_depths(f2)
 
 df_expanded = df_expanded.merge(f1, on='Borehole ID', how='left')
 df_expanded['Sampling Elevation'] = df_expanded['Elevation'] - df_expanded['Sampling Depth']
@@ -1,3 +1,4 @@
+import re
 import pandas as pd
 import numpy as np
 
@@ -6,17 +7,6 @@ path_export='./Data/Data_result/file_2_originalUSCSclean.csv'
 
 f2=pd.read_csv(path_f2_original)
 
-def clean_linebreaks(s):
-    if s==None: return None
-    s=str(s)
-    s = s.replace('\x08', '')
-    s = s.strip('\r\n')
-    s = s.replace('\r\n', '-')
-    s = s.replace(' ', '')
-    return s
-
-f2['USCS_clean']=f2['USCS'].apply(clean_linebreaks)
-
 uscs_format=["GW", "GP", "GM", "GC", "SW", "SP", "SM", "SC", "ML", "CL", "OL", "MH", "CH", "OH", "PT"]
 uscs_group_map = {
     "GW": "gravel",
@@ -36,35 +26,31 @@ uscs_group_map = {
     "PT": "pt"
 }
 
-def clean_validate(s, l_format=uscs_format, dict_group=uscs_group_map):
-    if s==None: return None
-    if s.count('-') > 1:
-        return None
-    if ',' in s:
-        return None
-    if 'No' in s or 'nan' in s:
-        return None
-    if '-' in s:
-        part1, part2 = s.split('-')
-        if part1 not in l_format or part2 not in l_format:
-            return None
-        if part1==part2: return part1
-        if dict_group.get(part1) != dict_group.get(part2):
-            return None
-    if '-' not in s and s not in l_format:
-        return None
-    return s
-
-f2['USCS_clean']=f2['USCS_clean'].apply(clean_validate)
-
-def clean_joint(s):
-    if s==None: return None
-    if '-' not in s:
-        return s
-    if s == 'SP-SM':
-        return s
-    return s.split('-')[0]
-f2['USCS_clean']=f2['USCS_clean'].apply(clean_joint)
+# valid single symbols and dual symbols (e.g. SP-SM), after line breaks and spaces are cleaned
+uscs_pattern=re.compile(r'^({0})(?:-({0}))?\Z'.format('|'.join(uscs_format)))
+
+def clean_uscs(uscs, l_format=uscs_format, dict_group=uscs_group_map, pattern=uscs_pattern):
+    # each distinct raw value is cleaned once, then broadcast back through its factorized code.
+    # dual symbols keep only the first symbol (SP-SM is kept whole); duals from different
+    # groups and anything that is not a valid symbol become missing
+    codes, uniques=pd.factorize(uscs)
+    raw=pd.Series(uniques, dtype=object).map(str)
+    cleaned=(raw.str.replace('\x08', '', regex=False)
+                .str.strip('\r\n')
+                .str.replace('\r\n', '-', regex=False)
+                .str.replace(' ', '', regex=False))
+
+    parts=cleaned.str.extract(pattern)
+    first, second=parts[0], parts[1]
+    same_group=first.map(dict_group) == second.map(dict_group)
+    resolved=first.where(second.isna() | same_group)
+    resolved=resolved.mask((first == 'SP') & (second == 'SM'), 'SP-SM')
+
+    categories=l_format + ['SP-SM']
+    values=np.where(codes >= 0, resolved.to_numpy(dtype=object)[codes], None)
+    return pd.Categorical(values, categories=categories)
+
+f2['USCS_clean']=clean_uscs(f2['USCS'])
 
 f2.drop(columns=['USCS'], inplace=True, axis=1)
 f2=f2.rename(columns={'USCS_clean': 'USCS'})
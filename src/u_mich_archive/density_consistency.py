@@ -1,40 +1,53 @@
 import re
+import numpy as np
+import pandas as pd
 
 
-def get_density(uscs, sptn):
-    if type(uscs) != str: 
+COARSE_CODES = ["GW", "GP", "GM", "GC", "SW", "SP", "SM", "SC"]
+FINE_CODES = ["ML", "CL", "OL", "MH", "CH", "OH", "PT"]
+
+# Upper SPTN bound (inclusive) of every class but the last
+COARSE_THRESHOLDS = [4, 10, 24, 50]
+COARSE_LABELS = ['Very loose', 'Loose', 'Medium Dense', 'Dense', 'Very Dense']
+FINE_THRESHOLDS = [2, 4, 8, 15, 30]
+FINE_LABELS = ['Very soft', 'Soft', 'Medium Stiff', 'Stiff', 'Very stiff', 'Hard']
+
+
+def get_soil_category(uscs):
+    # 'coarse' if any coarse-grained code appears, else 'fine' if any fine-grained one does
+    if type(uscs) != str:
         return None
     types = re.findall(r'\b[A-Z]{2}\b', uscs)
-    coarse, fine= False, False
-    for t in types:
-        if t in ["GW", "GP", "GM", "GC", "SW", "SP", "SM", "SC"]:
-            coarse = True
-            break
-        elif t in ["ML", "CL", "OL", "MH", "CH", "OH", "PT"]:
-            fine = True
-    
-    if coarse:
-        if sptn <= 4:
-            return 'Very loose'
-        elif sptn <= 10:
-            return 'Loose'
-        elif sptn <= 24:
-            return 'Medium Dense'
-        elif sptn <= 50:
-            return 'Dense'
-        else:
-            return 'Very Dense'
-    elif fine:
-        if sptn <= 2:
-            return 'Very soft'
-        elif sptn <= 4:
-            return 'Soft'
-        elif sptn <= 8:
-            return 'Medium Stiff'
-        elif sptn <= 15:
-            return 'Stiff'
-        elif sptn <= 30:
-            return 'Very stiff'
-        else:
-            return 'Hard'
-        
\ No newline at end of file
+    if any(t in COARSE_CODES for t in types):
+        return 'coarse'
+    if any(t in FINE_CODES for t in types):
+        return 'fine'
+    return None
+
+
+def get_density(uscs, sptn):
+    category = get_soil_category(uscs)
+    if category == 'coarse':
+        thresholds, labels = COARSE_THRESHOLDS, COARSE_LABELS
+    elif category == 'fine':
+        thresholds, labels = FINE_THRESHOLDS, FINE_LABELS
+    else:
+        return None
+    for threshold, label in zip(thresholds, labels):
+        if sptn <= threshold:
+            return label
+    return labels[-1]
+
+
+def get_density_vectorized(uscs, sptn):
+    # get_density over whole columns: the category is looked up once per distinct USCS
+    # string, and SPTN is binned with searchsorted (side='left' keeps bounds inclusive;
+    # NaN sorts past every bound, like the failed comparisons in get_density)
+    uscs = pd.Series(uscs)
+    categories = uscs.map({u: get_soil_category(u) for u in uscs.dropna().unique()})
+    sptn = np.asarray(sptn, dtype=float)
+
+    coarse = np.array(COARSE_LABELS, dtype=object)[np.searchsorted(COARSE_THRESHOLDS, sptn, side='left')]
+    fine = np.array(FINE_LABELS, dtype=object)[np.searchsorted(FINE_THRESHOLDS, sptn, side='left')]
+    density = np.where(categories == 'coarse', coarse, np.where(categories == 'fine', fine, None))
+    return pd.Series(density, index=uscs.index, dtype=object)
@@ -1,5 +1,6 @@
+import numpy as np
 import pandas as pd
-from density_consistency import get_density
+from density_consistency import get_density_vectorized
 
 
 def get_filtered_boreholes(sptn, layering, max_depth_diff=10, sptn_threshold=45):
@@ -27,15 +28,75 @@ def get_filtered_boreholes(sptn, layering, max_depth_diff=10, sptn_threshold=45)
     )
 
 
+def interval_join(points, intervals, key="Borehole ID", position="Test Depth",
+                  start="Top Depth", end="Bottom Depth"):
+    """
+    Joins each point to every interval of the same key with start <= position < end,
+    giving the same rows, in the same order, as merging on key and then filtering.
+
+    Intervals are sorted by (key, start). For keys whose intervals do not overlap,
+    a point can only lie in the interval with the greatest start <= position, so
+    every such point is placed with one searchsorted and memory stays linear in
+    points + intervals. Keys with overlapping intervals (where a point may lie in
+    several) go through merge-and-filter, restricted to those keys only. A point
+    right at the junction of two intervals goes to the lower one. Points without
+    an interval are dropped; a NaN key matches NaN keys, as in merge.
+    """
+    intervals = intervals[intervals[start] < intervals[end]]
+    # NaN keys get a code of their own, since merge joins NaN to NaN
+    codes, _ = pd.factorize(pd.concat([intervals[key], points[key]], ignore_index=True),
+                            use_na_sentinel=False)
+    interval_codes, point_codes = codes[:len(intervals)], codes[len(intervals):]
+
+    # exact integer rank of every depth, so (key, depth) packs into one sortable int64
+    starts = intervals[start].to_numpy(dtype=float)
+    ends = intervals[end].to_numpy(dtype=float)
+    positions = points[position].to_numpy(dtype=float)
+    depths = np.unique(np.concatenate([starts, positions[~np.isnan(positions)]]))
+    width = len(depths) + 1
+    interval_keys = interval_codes * width + np.searchsorted(depths, starts)
+    order = np.argsort(interval_keys, kind="stable")
+    interval_keys = interval_keys[order]
+
+    # a key overlaps if some interval starts before an earlier (sorted) one of it ends
+    sorted_codes = interval_codes[order]
+    previous_end = pd.Series(ends[order]).groupby(sorted_codes).cummax().groupby(sorted_codes).shift()
+    overlapping = np.unique(sorted_codes[starts[order] < previous_end.to_numpy()])
+    point_overlaps = np.isin(point_codes, overlapping)
+
+    point_keys = point_codes * width + np.searchsorted(depths, positions)
+    found = np.searchsorted(interval_keys, point_keys, side="right") - 1
+    if len(order):
+        candidate = order[np.clip(found, 0, None)]
+        matched = ((found >= 0) & ~np.isnan(positions) & ~point_overlaps
+                   & (interval_codes[candidate] == point_codes)
+                   & (positions < ends[candidate]))
+    else:
+        candidate = np.zeros(len(points), dtype=int)
+        matched = np.zeros(len(points), dtype=bool)
+    point_rows, interval_rows = np.flatnonzero(matched), candidate[matched]
+
+    if len(overlapping):
+        # merge-and-filter on row positions, only for the keys with overlapping intervals
+        left = pd.DataFrame({"code": point_codes, "point": np.arange(len(points))})[point_overlaps]
+        right = pd.DataFrame({"code": interval_codes, "interval": np.arange(len(intervals))})
+        right = right[np.isin(interval_codes, overlapping)]
+        pairs = pd.merge(left, right, on="code")
+        pair_positions = positions[pairs["point"]]
+        inside = (starts[pairs["interval"]] <= pair_positions) & (pair_positions < ends[pairs["interval"]])
+        point_rows = np.concatenate([point_rows, pairs["point"].to_numpy()[inside]])
+        interval_rows = np.concatenate([interval_rows, pairs["interval"].to_numpy()[inside]])
+        # merge order: points in input order, then each point's intervals in input order
+        pair_order = np.lexsort([interval_rows, point_rows])
+        point_rows, interval_rows = point_rows[pair_order], interval_rows[pair_order]
+
+    joined = intervals.iloc[interval_rows].drop(columns=[key]).reset_index(drop=True)
+    return pd.concat([points.iloc[point_rows].reset_index(drop=True), joined], axis=1)
+
+
 def merge_all(boreholes, layering, sptn, filtered_boreholes):
-    uscs_sptn = pd.merge(sptn, layering, on=["Borehole ID"], how="inner")
-    
     # If the test depth is right at the junction of two layers, it is assigned to the lower layer.
-    uscs_sptn = uscs_sptn[(uscs_sptn["Test Depth"] >= uscs_sptn["Top Depth"]) & 
-                          (uscs_sptn["Test Depth"] < uscs_sptn["Bottom Depth"])]
-    # If the test depth is right at the junction of two layers, it is assigned to both layers.
-    # uscs_sptn = uscs_sptn[(uscs_sptn["Test Depth"] >= uscs_sptn["Top Depth"]) &
-    #                       (uscs_sptn["Test Depth"] <= uscs_sptn["Bottom Depth"])]
+    uscs_sptn = interval_join(sptn, layering)
     uscs_sptn_filtered = uscs_sptn[uscs_sptn["Borehole ID"].isin(filtered_boreholes)]
 
     boreholes_uscs_sptn = pd.merge(boreholes, uscs_sptn_filtered, on=["Borehole ID"], how="right")
@@ -46,8 +107,8 @@ def merge_all(boreholes, layering, sptn, filtered_boreholes):
     boreholes_uscs_sptn["Test Depth"] = boreholes_uscs_sptn["Elevation"] - boreholes_uscs_sptn["Test Depth"]
 
     # Add a column for density/consistency
-    boreholes_uscs_sptn['Density / Consistency'] = boreholes_uscs_sptn.apply(
-        lambda row: get_density(row['USCS'], row['SPTN']), axis=1
+    boreholes_uscs_sptn['Density / Consistency'] = get_density_vectorized(
+        boreholes_uscs_sptn['USCS'], boreholes_uscs_sptn['SPTN']
     )
 
     # Rename the columns
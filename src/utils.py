@@ -1,6 +1,60 @@
+import functools
+import numpy as np
 import pandas as pd
 import pyproj
 
+# Points transformed per pyproj call; bounds the temporary arrays for very large frames
+TRANSFORM_CHUNK_SIZE = 1_000_000
+
+@functools.lru_cache(maxsize=32)
+def get_transformer(source_crs: str, target_crs: str) -> pyproj.Transformer:
+    """
+    Return a cached transformer between two CRS.
+
+    Building a Transformer parses both CRS definitions and searches the PROJ
+    database for an operation, so one is built per (source, target) pair and reused.
+    always_xy=True keeps the order (longitude, latitude) for geographic CRS
+    and (easting, northing) for projected CRS.
+    """
+    return pyproj.Transformer.from_crs(pyproj.CRS(source_crs), pyproj.CRS(target_crs), always_xy=True)
+
+def transform_coordinates(
+        x,
+        y,
+        source_crs: str,
+        target_crs: str,
+        chunk_size: int = TRANSFORM_CHUNK_SIZE
+        ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Transform arrays of coordinates from one CRS to another.
+
+    Parameters
+    ----------
+    x, y : array-like
+        Coordinates in the source CRS (longitude/easting first).
+    source_crs : str
+        The source coordinate reference system (CRS) of the coordinates.
+    target_crs : str
+        The target coordinate reference system (CRS) of the coordinates.
+    chunk_size : int, optional
+        Number of points transformed per call. Defaults to TRANSFORM_CHUNK_SIZE.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        Transformed (x, y) as float64 arrays aligned with the input. Points that
+        cannot be transformed are inf, and missing inputs stay NaN.
+    """
+    x = np.asarray(x, dtype=np.float64).ravel()
+    y = np.asarray(y, dtype=np.float64).ravel()
+    transformer = get_transformer(source_crs, target_crs)
+    out_x = np.empty_like(x)
+    out_y = np.empty_like(y)
+    for start in range(0, len(x), chunk_size):
+        end = start + chunk_size
+        out_x[start:end], out_y[start:end] = transformer.transform(x[start:end], y[start:end])
+    return out_x, out_y
+
 def transform_crs(
         df: pd.DataFrame,
         source_crs: str,
@@ -27,27 +81,16 @@ def transform_crs(
     Returns
     -------
     pd.DataFrame
-        A new DataFrame with the transformed coordinates.
+        The DataFrame with the transformed coordinates added as new columns.
+        Rows that cannot be transformed are kept, with inf (or NaN for missing
+        input) coordinates.
     """
-    src_crs_pyproj = pyproj.CRS(source_crs)
-    tgt_crs_pyproj = pyproj.CRS(target_crs)
-
-    # Create a transformer object
-    # always_xy=True ensures the order is always (longitude, latitude) for geographic CRS
-    # and (easting, northing) for projected CRS.
-    transformer = pyproj.Transformer.from_crs(src_crs_pyproj, tgt_crs_pyproj, always_xy=True)
-
-    transformed_lat = []
-    transformed_long = []
-    for _, row in df.iterrows():
-        x = row[longitude_column]
-        y = row[latitude_column]
-        transformed_x, transformed_y = transformer.transform(x, y)
-        if transformed_x is None or transformed_y is None:
-            print(f"Error transforming point ({x}, {y})")
-            continue
-        transformed_long.append(transformed_x)
-        transformed_lat.append(transformed_y)
+    transformed_long, transformed_lat = transform_coordinates(
+        df[longitude_column].to_numpy(), df[latitude_column].to_numpy(), source_crs, target_crs)
+
+    failed = ~(np.isfinite(transformed_long) & np.isfinite(transformed_lat))
+    if failed.any():
+        print(f"Error transforming {failed.sum()} of {len(df)} points; their coordinates are inf or NaN")
 
     cleaned_target_crs = ''.join(char for char in target_crs if char.isalnum())
     new_longitude_column = cleaned_target_crs + '_LONGITUDE'
@@ -56,4 +99,4 @@ def transform_crs(
     df[new_longitude_column] = transformed_long
     df[new_latitude_column] = transformed_lat
 
-    return df
\ No newline at end of file
+    return df
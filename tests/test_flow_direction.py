@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'dem_processor'))
+
+from feature_exractor import D8_LOOKUP, calculate_flow_direction_d8
+
+
+def reference_flow_direction_d8(dem_array):
+    """The original per-cell loop: raw drops, interior cells only."""
+    rows, cols = dem_array.shape
+    flow_dir = np.zeros_like(dem_array, dtype=np.uint8)
+    for r in range(1, rows - 1):
+        for c in range(1, cols - 1):
+            center_elev = dem_array[r, c]
+            max_drop = 0
+            best_dir = 0
+            for dr, dc, d_code in D8_LOOKUP:
+                drop = center_elev - dem_array[r + dr, c + dc]
+                if drop > max_drop:
+                    max_drop = drop
+                    best_dir = d_code
+            flow_dir[r, c] = best_dir
+    return flow_dir
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_reference_loop(seed):
+    rng = np.random.default_rng(seed)
+    # integer elevations give plenty of ties and flats
+    dem = rng.integers(0, 6, size=(40, 33)).astype(np.float64)
+    result = calculate_flow_direction_d8(dem, distance_weighted=False)
+    expected = reference_flow_direction_d8(dem)
+    np.testing.assert_array_equal(result[1:-1, 1:-1], expected[1:-1, 1:-1])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_reference_loop_with_nan_holes(seed):
+    rng = np.random.default_rng(seed)
+    dem = rng.normal(100, 5, size=(30, 45))
+    dem[rng.random(dem.shape) < 0.15] = np.nan
+    result = calculate_flow_direction_d8(dem, distance_weighted=False)
+    expected = reference_flow_direction_d8(dem)
+    np.testing.assert_array_equal(result[1:-1, 1:-1], expected[1:-1, 1:-1])
+    assert (result[np.isnan(dem)] == 0).all()
+
+
+def test_distance_weighting_prefers_steeper_cardinal():
+    dem = np.full((3, 3), 10.0)
+    dem[1, 1] = 5.0
+    dem[1, 2] = 4.0  # E: drop 1
+    dem[2, 2] = 3.6  # SE: drop 1.4, slope 1.4 / sqrt(2) < 1
+    assert calculate_flow_direction_d8(dem, distance_weighted=False)[1, 1] == 128
+    assert calculate_flow_direction_d8(dem)[1, 1] == 1
+
+
+def test_edge_cells_use_in_bounds_neighbours():
+    dem = np.array([[3.0, 2.0, 1.0]])
+    np.testing.assert_array_equal(calculate_flow_direction_d8(dem), [[1, 1, 0]])
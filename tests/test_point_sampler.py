@@ -0,0 +1,77 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import rasterio
+import rtree
+from rasterio.transform import from_origin
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'dem_processor'))
+
+from catalogue import RasterCatalogue
+from point_sampler import get_features_at_coordinates, sample_raster_points
+from raster_cache import RasterCache
+
+RES = 30.0
+ROWS, COLS = 60, 120
+
+
+def _surface():
+    rows, cols = np.mgrid[0:ROWS, 0:COLS]
+    return (np.sin(cols / 7.0) * 40 + np.cos(rows / 5.0) * 30 + cols * 0.5).astype(np.float32)
+
+
+def _write_tile(path, elevation, col_off):
+    with rasterio.open(path, 'w', driver='GTiff', width=elevation.shape[1], height=elevation.shape[0],
+                       count=1, dtype='float32', crs='EPSG:32610', nodata=np.nan,
+                       transform=from_origin(col_off * RES, 0.0, RES, RES)) as dst:
+        dst.write(elevation, 1)
+    with rasterio.open(path) as src:
+        return {'path': str(path), 'type': 'TIF', 'bounds': src.bounds, 'crs': None}
+
+
+@pytest.fixture
+def seam(tmp_path):
+    """
+    Two reprojected-style tiles of one surface meeting at column 60. The left tile
+    runs two pixels past the seam, and those two columns are a NaN NoData border.
+    """
+    surface = _surface()
+    left = surface[:, :62].copy()
+    left[:, 60:] = np.nan
+    tiles = [
+        dict(_write_tile(tmp_path / 'left.tif', left, 0), id=0),
+        dict(_write_tile(tmp_path / 'right.tif', surface[:, 60:], 60), id=1),
+    ]
+    spatial_index = rtree.index.Index()
+    for tile in tiles:
+        spatial_index.insert(tile['id'], tuple(tile['bounds']))
+    mosaic = _write_tile(tmp_path / 'mosaic.tif', surface, 0)
+    return spatial_index, RasterCatalogue.from_info_list(tiles), mosaic['path']
+
+
+@pytest.mark.parametrize("raster_cache", [None, RasterCache()])
+@pytest.mark.parametrize("point_cols", [
+    # beside the NoData border only: every window stays inside the left tile
+    [57, 58, 59],
+    # the seam's neighbourhood, the NoData border, and interior pixels of both tiles
+    [30, 57, 58, 59, 60, 61, 62, 90],
+])
+def test_nodata_border_matches_mosaic(seam, raster_cache, point_cols):
+    spatial_index, raster_catalogue, mosaic_path = seam
+    cols = np.repeat(np.array(point_cols), 3)
+    rows = np.tile(np.array([0, 25, ROWS - 1]), len(point_cols))
+    x = (cols + 0.5) * RES
+    y = -(rows + 0.5) * RES
+
+    result = get_features_at_coordinates(x, y, spatial_index, raster_catalogue,
+                                         cluster_size=16, raster_cache=raster_cache)
+    with rasterio.open(mosaic_path) as src:
+        expected = sample_raster_points(src, x, y, cluster_size=16)
+
+    for name, values in zip(['elevation', 'slope', 'aspect'], expected):
+        assert not np.isnan(result[name]).any(), name
+        np.testing.assert_allclose(result[name], values, rtol=1e-5, atol=1e-5, err_msg=name)
+    # the left tile has the lower id, so it is sampled wherever it reaches
+    np.testing.assert_array_equal(result['raster_id'], np.where(cols < 62, 0, 1))